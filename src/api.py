@@ -12,8 +12,16 @@ from fastapi.responses import FileResponse
 from pydantic import BaseModel
 
 from src.config import API_HOST, API_PORT, DEFAULT_TOP_N, RISK_PROFILES
-from src.db import execute_query, get_latest_date, init_db
-from src.portfolio import get_stock_detail, get_top_stocks
+from src.db import (
+    get_latest_date,
+    get_latest_price_date,
+    get_price_tickers,
+    get_published_run,
+    init_db,
+    run_db,
+    shutdown_db_executor,
+)
+from src.portfolio import get_custom_top_stocks, get_stock_detail, get_top_stocks
 
 STATIC_DIR = Path(__file__).resolve().parent / "static"
 
@@ -96,6 +104,7 @@ class ProfilesResponse(BaseModel):
 async def lifespan(app: FastAPI):
     init_db()
     yield
+    shutdown_db_executor()
 
 
 app = FastAPI(
@@ -113,42 +122,22 @@ app.add_middleware(
 )
 
 
-# ── Endpoints ─────────────────────────────────────────────────────────────────
-
-@app.get("/", response_class=FileResponse, include_in_schema=False)
-def dashboard():
-    """Serve the single-page dashboard."""
-    return FileResponse(STATIC_DIR / "index.html", media_type="text/html")
-
-
-@app.get("/health", response_model=HealthResponse)
-def health():
-    """Database status, ticker count, and latest dates."""
-    rows = execute_query("SELECT COUNT(DISTINCT ticker) FROM prices")
-    ticker_count = rows[0][0] if rows else 0
+# ── Blocking Handlers ─────────────────────────────────────────────────────────
+# Run on the DB executor via ``run_db``; the async endpoints only validate
+# input and await them, so the event loop never blocks on SQLite.
 
+def _health_response() -> HealthResponse:
+    published = get_published_run()
     return HealthResponse(
         status="ok",
-        ticker_count=ticker_count,
-        latest_price_date=get_latest_date("prices", "date"),
-        latest_metrics_date=get_latest_date("metrics", "as_of_date"),
-        latest_scores_date=get_latest_date("scores", "as_of_date"),
+        ticker_count=len(get_price_tickers()),
+        latest_price_date=get_latest_price_date(),
+        latest_metrics_date=get_latest_date("metrics", "as_of_date", run_id=published),
+        latest_scores_date=get_latest_date("scores", "as_of_date", run_id=published),
     )
 
 
-@app.get("/rankings", response_model=RankingsResponse)
-def rankings(
-    risk_profile: str = Query("medium", description="Risk profile: low, medium, high"),
-    top_n: int = Query(DEFAULT_TOP_N, ge=1, le=500, description="Number of stocks"),
-):
-    """Ranked stocks with scores and metrics for a risk profile."""
-    if risk_profile not in RISK_PROFILES:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unknown risk_profile '{risk_profile}'. "
-                   f"Choose from: {', '.join(RISK_PROFILES)}",
-        )
-
+def _rankings_response(risk_profile: str, top_n: int) -> RankingsResponse:
     df = get_top_stocks(risk_profile=risk_profile, top_n=top_n)
 
     if df.empty:
@@ -159,7 +148,7 @@ def rankings(
             stocks=[],
         )
 
-    as_of = get_latest_date("scores", "as_of_date")
+    as_of = df["as_of_date"].iloc[0]
     stocks = [RankedStock(**row) for row in df.to_dict(orient="records")]
 
     return RankingsResponse(
@@ -170,10 +159,21 @@ def rankings(
     )
 
 
-@app.get("/stock/{ticker}", response_model=StockDetailResponse)
-def stock_detail(ticker: str):
-    """Detailed metrics and scores across all profiles for a single stock."""
-    ticker = ticker.upper()
+def _custom_rankings_response(
+    weights: dict[str, float], top_n: int,
+) -> RankingsResponse:
+    as_of, df = get_custom_top_stocks(weights, top_n=top_n)
+    stocks = [RankedStock(**row) for row in df.to_dict(orient="records")]
+
+    return RankingsResponse(
+        risk_profile="custom",
+        as_of_date=as_of,
+        count=len(stocks),
+        stocks=stocks,
+    )
+
+
+def _stock_detail_response(ticker: str) -> StockDetailResponse:
     detail = get_stock_detail(ticker)
 
     if not detail["metrics"]:
@@ -182,6 +182,55 @@ def stock_detail(ticker: str):
     return StockDetailResponse(**detail)
 
 
+# ── Endpoints ─────────────────────────────────────────────────────────────────
+
+@app.get("/", response_class=FileResponse, include_in_schema=False)
+def dashboard():
+    """Serve the single-page dashboard."""
+    return FileResponse(STATIC_DIR / "index.html", media_type="text/html")
+
+
+@app.get("/health", response_model=HealthResponse)
+async def health():
+    """Database status, ticker count, and latest published dates."""
+    return await run_db(_health_response)
+
+
+@app.get("/rankings", response_model=RankingsResponse)
+async def rankings(
+    risk_profile: str = Query("medium", description="Risk profile: low, medium, high"),
+    top_n: int = Query(DEFAULT_TOP_N, ge=1, le=500, description="Number of stocks"),
+):
+    """Ranked stocks with scores and metrics for a risk profile."""
+    if risk_profile not in RISK_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown risk_profile '{risk_profile}'. "
+                   f"Choose from: {', '.join(RISK_PROFILES)}",
+        )
+
+    return await run_db(_rankings_response, risk_profile, top_n)
+
+
+@app.get("/rankings/custom", response_model=RankingsResponse)
+async def custom_rankings(
+    alpha: float = Query(RISK_PROFILES["medium"]["alpha"], description="Volatility penalty"),
+    beta: float = Query(RISK_PROFILES["medium"]["beta"], description="Drawdown penalty"),
+    gamma: float = Query(RISK_PROFILES["medium"]["gamma"], description="Downside deviation penalty"),
+    delta: float = Query(RISK_PROFILES["medium"]["delta"], description="Momentum bonus"),
+    top_n: int = Query(DEFAULT_TOP_N, ge=1, le=500, description="Number of stocks"),
+):
+    """Ranked stocks under ad-hoc weights, scored in memory on the fly."""
+    weights = {"alpha": alpha, "beta": beta, "gamma": gamma, "delta": delta}
+    return await run_db(_custom_rankings_response, weights, top_n)
+
+
+@app.get("/stock/{ticker}", response_model=StockDetailResponse)
+async def stock_detail(ticker: str):
+    """Detailed metrics and scores across all profiles for a single stock."""
+    return await run_db(_stock_detail_response, ticker.upper())
+
+
 @app.get("/profiles", response_model=ProfilesResponse)
 def profiles():
     """Available risk profiles and their weight parameters."""
@@ -0,0 +1,630 @@
+"""Performance benchmarks for the pipeline stages.
+
+Run with ``python -m src.benchmark [name ...]``; each benchmark prints a
+small timing table. Benchmarks that need a large universe build a synthetic
+random-walk price database in a temporary directory, and those that time
+the API read path run against a temporary copy of ``market.db``, so the
+real database is never modified. The API load benchmark drives the app
+with httpx, installed by ``requirements-dev.txt``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI
+
+import src.db
+import src.portfolio
+import src.pull_prices
+from src import api
+from src.compute_metrics import compute_all_metrics
+from src.config import (
+    DB_EXECUTOR_WORKERS,
+    DB_PATH,
+    RISK_PROFILES,
+    SQLITE_READ_PRAGMAS,
+    SQLITE_WRITE_PRAGMAS,
+)
+from src.db import (
+    begin_run,
+    close_connections,
+    frame_rows,
+    get_connection,
+    init_db,
+    publish_run,
+    shutdown_db_executor,
+    upsert_rows,
+)
+from src.score_stocks import score_profiles
+
+logger = logging.getLogger(__name__)
+
+
+def _best_of(fn: Callable[[], object], repeat: int = 3) -> float:
+    """Return the best wall-clock time of ``repeat`` calls, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+@contextmanager
+def _temporary_database(source: Path | None = None) -> Iterator[Path]:
+    """
+    Point the db layer at a throwaway database for the duration.
+
+    The database starts empty, or as a (migrated) copy of ``source``.
+    """
+    original = src.db.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        src.db.DB_PATH = Path(tmp) / "bench.db"
+        if source is not None:
+            shutil.copyfile(source, src.db.DB_PATH)
+        try:
+            init_db()
+            yield src.db.DB_PATH
+        finally:
+            close_connections()
+            src.db.DB_PATH = original
+
+
+def _write_synthetic_prices(
+    n_tickers: int, n_days: int, seed: int = 0,
+) -> None:
+    """Fill the prices table with random-walk closes for a fake universe."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end="2026-01-30", periods=n_days)
+    days = (dates - pd.Timestamp("1970-01-01")).days.tolist()
+    returns = rng.normal(0.0004, 0.02, size=(n_days, n_tickers))
+    close = 100.0 * np.cumprod(1.0 + returns, axis=0)
+
+    with get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO tickers (id, symbol) VALUES (?, ?)",
+            ((j + 1, f"T{j:05d}") for j in range(n_tickers)),
+        )
+        conn.executemany(
+            "INSERT INTO price_bars (ticker_id, day, adj_close, volume) "
+            "VALUES (?, ?, ?, ?)",
+            (
+                (j + 1, day, float(close[i, j]), 1_000_000)
+                for j in range(n_tickers)
+                for i, day in enumerate(days)
+            ),
+        )
+
+
+def bench_metrics_workers(n_tickers: int = 3000, n_days: int = 504) -> None:
+    """Scaling of sharded metric computation with the worker count."""
+    cpus = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, 8, 16, cpus} & set(range(1, cpus + 1)))
+
+    with _temporary_database():
+        _write_synthetic_prices(n_tickers, n_days)
+        serial = compute_all_metrics(workers=1)
+        baseline = _best_of(lambda: compute_all_metrics(workers=1))
+
+        print(f"metrics: {n_tickers} tickers x {n_days} days, {cpus} CPUs")
+        print(f"{'workers':>8} {'seconds':>9} {'speedup':>8} {'identical':>10}")
+        for workers in counts:
+            result = compute_all_metrics(workers=workers)
+            elapsed = _best_of(lambda: compute_all_metrics(workers=workers))
+            print(
+                f"{workers:>8} {elapsed:>9.3f} {baseline / elapsed:>8.2f} "
+                f"{str(result.equals(serial)):>10}"
+            )
+
+
+def bench_scoring_profiles(n_tickers: int = 3000) -> None:
+    """Cost of matrix scoring as the number of weight profiles grows."""
+    rng = np.random.default_rng(0)
+    metrics = pd.DataFrame({
+        "ticker": [f"T{i:05d}" for i in range(n_tickers)],
+        "as_of_date": "2026-01-30",
+        "annualized_return": rng.normal(0.1, 0.3, n_tickers),
+        "volatility": rng.uniform(0.1, 0.8, n_tickers),
+        "downside_deviation": rng.uniform(0.05, 0.5, n_tickers),
+        "max_drawdown": -rng.uniform(0.05, 0.7, n_tickers),
+        "momentum": rng.normal(0.05, 0.3, n_tickers),
+    })
+
+    print(f"scoring: {n_tickers} tickers")
+    print(f"{'profiles':>9} {'seconds':>9} {'us/profile':>11}")
+    for n_profiles in (3, 100, 1000):
+        profiles = {
+            f"client_{i}": dict(zip(
+                ("alpha", "beta", "gamma", "delta"), rng.uniform(0, 2, 4)
+            ))
+            for i in range(n_profiles)
+        }
+        elapsed = _best_of(lambda: score_profiles(metrics, profiles))
+        print(
+            f"{n_profiles:>9} {elapsed:>9.3f} "
+            f"{elapsed / n_profiles * 1e6:>11.0f}"
+        )
+
+
+def bench_db_connections(requests: int = 200) -> None:
+    """Per-request API latency with and without pooled connections."""
+    if not DB_PATH.exists():
+        print(f"db-connections: {DB_PATH} not found; run the pipeline first")
+        return
+
+    original = src.db.DB_POOL_CONNECTIONS
+    with _temporary_database(DB_PATH):
+        ticker = api._rankings_response("medium", 1).stocks[0].ticker
+        endpoints: dict[str, Callable[[], object]] = {
+            "/health": api._health_response,
+            "/rankings": lambda: api._rankings_response("medium", 10),
+            "/stock/{ticker}": lambda: api._stock_detail_response(ticker),
+        }
+
+        print(f"db-connections: {DB_PATH.name}, "
+              f"{requests} requests per endpoint")
+        print(f"{'endpoint':>16} {'fresh ms':>9} {'pooled ms':>10} "
+              f"{'speedup':>8}")
+        try:
+            for name, call in endpoints.items():
+                latency = {}
+                for pooled in (False, True):
+                    src.db.DB_POOL_CONNECTIONS = pooled
+                    elapsed = _best_of(
+                        lambda: [call() for _ in range(requests)]
+                    )
+                    latency[pooled] = elapsed / requests * 1e3
+                print(
+                    f"{name:>16} {latency[False]:>9.3f} "
+                    f"{latency[True]:>10.3f} "
+                    f"{latency[False] / latency[True]:>8.2f}"
+                )
+        finally:
+            src.db.DB_POOL_CONNECTIONS = original
+
+
+def _pragma_settings(
+    profile: dict[str, int | str],
+) -> dict[str, dict[str, int | str]]:
+    """SQLite defaults, each PRAGMA of ``profile`` alone, and the profile."""
+    settings: dict[str, dict[str, int | str]] = {"defaults": {}}
+    for name, value in profile.items():
+        settings[f"{name}={value}"] = {name: value}
+    settings["profile"] = dict(profile)
+    return settings
+
+
+def bench_db_pragmas(requests: int = 200, commits: int = 200) -> None:
+    """API read latency and pipeline write throughput per PRAGMA setting."""
+    read_original = src.db.SQLITE_READ_PRAGMAS
+    write_original = src.db.SQLITE_WRITE_PRAGMAS
+    try:
+        if DB_PATH.exists():
+            with _temporary_database(DB_PATH):
+                ticker = api._rankings_response("medium", 1).stocks[0].ticker
+
+                def serve() -> None:
+                    api._health_response()
+                    api._rankings_response("medium", 10)
+                    api._stock_detail_response(ticker)
+
+                print(f"db-pragmas reads: {DB_PATH.name}, "
+                      f"{requests} x (/health, /rankings, /stock)")
+                print(f"{'setting':>22} {'ms/request':>11}")
+                for name, pragmas in _pragma_settings(
+                    SQLITE_READ_PRAGMAS
+                ).items():
+                    src.db.SQLITE_READ_PRAGMAS = pragmas
+                    close_connections()
+                    elapsed = _best_of(
+                        lambda: [serve() for _ in range(requests)]
+                    )
+                    print(f"{name:>22} {elapsed / requests * 1e3:>11.3f}")
+        else:
+            print(f"db-pragmas reads: {DB_PATH} not found; skipped")
+
+        print(f"db-pragmas writes: 500 x 504 bulk load + {commits} commits")
+        print(f"{'setting':>22} {'bulk s':>8} {'ms/commit':>10}")
+        for name, pragmas in _pragma_settings(SQLITE_WRITE_PRAGMAS).items():
+            src.db.SQLITE_WRITE_PRAGMAS = pragmas
+            with _temporary_database():
+                start = time.perf_counter()
+                _write_synthetic_prices(500, 504)
+                bulk = time.perf_counter() - start
+
+                start = time.perf_counter()
+                for i in range(commits):
+                    with get_connection() as conn:
+                        conn.execute(
+                            "INSERT INTO dirty_tickers (ticker, stage) "
+                            "VALUES (?, 'bench')",
+                            (f"T{i:05d}",),
+                        )
+                per_commit = (time.perf_counter() - start) / commits
+            print(f"{name:>22} {bulk:>8.3f} {per_commit * 1e3:>10.3f}")
+    finally:
+        src.db.SQLITE_READ_PRAGMAS = read_original
+        src.db.SQLITE_WRITE_PRAGMAS = write_original
+        close_connections()
+
+
+def _explain(query: str, params: tuple = ()) -> list[str]:
+    """Return the EXPLAIN QUERY PLAN detail lines for ``query``."""
+    with get_connection(readonly=True) as conn:
+        return [
+            row[-1] for row in
+            conn.execute(f"EXPLAIN QUERY PLAN {query}", params)
+        ]
+
+
+def bench_query_plans() -> None:
+    """Check the API's portfolio queries use indexes rather than scans."""
+    captured: list[tuple[str, str, tuple]] = []
+    load_dataframe = src.portfolio.load_dataframe
+
+    def capture(query: str, params: tuple = ()) -> pd.DataFrame:
+        captured.append((caller, query, params))
+        return load_dataframe(query, params)
+
+    calls: dict[str, Callable[[], object]] = {
+        "get_top_stocks": lambda: src.portfolio.get_top_stocks("medium"),
+        "get_top_stocks(date)": lambda: src.portfolio.get_top_stocks(
+            "medium", as_of_date="2026-01-30"
+        ),
+        "get_stock_detail": lambda: src.portfolio.get_stock_detail("T00000"),
+        "get_custom_top_stocks": lambda: src.portfolio.get_custom_top_stocks(
+            RISK_PROFILES["medium"]
+        ),
+    }
+
+    with _temporary_database():
+        with get_connection() as conn:
+            publish_run(conn, begin_run(conn))
+        src.portfolio.load_dataframe = capture
+        try:
+            for caller, call in calls.items():
+                call()
+        finally:
+            src.portfolio.load_dataframe = load_dataframe
+
+        scans = 0
+        print("query-plans: portfolio queries")
+        for caller, query, params in captured:
+            print(caller)
+            for detail in _explain(query, params):
+                # A bare SCAN reads the whole table; covering-index or
+                # ordered-index scans bounded by the WHERE clause are SEARCHes
+                flagged = detail.startswith("SCAN") and "USING" not in detail
+                scans += flagged
+                print(f"  {'!!' if flagged else 'ok'} {detail}")
+        print(f"{scans} full table scan(s)")
+
+
+def _sync_api() -> FastAPI:
+    """The read endpoints as sync handlers on Starlette's shared threadpool."""
+    app = FastAPI()
+
+    @app.get("/health")
+    def health():
+        return api._health_response()
+
+    @app.get("/rankings")
+    def rankings(risk_profile: str = "medium", top_n: int = 10):
+        return api._rankings_response(risk_profile, top_n)
+
+    @app.get("/stock/{ticker}")
+    def stock_detail(ticker: str):
+        return api._stock_detail_response(ticker.upper())
+
+    return app
+
+
+async def _drive_load(
+    app: FastAPI, paths: list[str], concurrency: int, requests: int,
+) -> tuple[float, list[float]]:
+    """Issue ``requests`` GETs from ``concurrency`` clients in-process."""
+    import httpx
+
+    pending = iter(range(requests))
+    latencies: list[float] = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+
+        async def client_loop() -> None:
+            for i in pending:
+                start = time.perf_counter()
+                response = await client.get(paths[i % len(paths)])
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return elapsed, latencies
+
+
+def bench_api_load(requests: int = 2000) -> None:
+    """Throughput and tail latency of sync vs async endpoints under load."""
+    if not DB_PATH.exists():
+        print(f"api-load: {DB_PATH} not found; run the pipeline first")
+        return
+
+    with _temporary_database(DB_PATH):
+        ticker = api._rankings_response("medium", 1).stocks[0].ticker
+        paths = [
+            "/rankings?risk_profile=medium", f"/stock/{ticker}", "/health",
+        ]
+        apps = {"sync": _sync_api(), "async": api.app}
+
+        print(f"api-load: {DB_PATH.name}, {requests} requests over "
+              f"{', '.join(paths)}; {DB_EXECUTOR_WORKERS} DB workers")
+        print(f"{'clients':>8} {'mode':>6} {'req/s':>8} {'p50 ms':>8} "
+              f"{'p99 ms':>8}")
+        try:
+            for concurrency in (1, 16, 64, 256):
+                for mode, app in apps.items():
+                    elapsed, latencies = asyncio.run(
+                        _drive_load(app, paths, concurrency, requests)
+                    )
+                    p50, p99 = np.percentile(latencies, [50, 99]) * 1e3
+                    print(f"{concurrency:>8} {mode:>6} "
+                          f"{requests / elapsed:>8.0f} {p50:>8.2f} "
+                          f"{p99:>8.2f}")
+        finally:
+            shutdown_db_executor()
+
+
+def _synthetic_fetcher(
+    latency: float, per_ticker: float, failure_rate: float, seed: int = 0,
+) -> src.pull_prices.PriceFetcher:
+    """A stand-in for Yahoo with fixed request latency and random failures."""
+    rng = np.random.default_rng(seed)
+    lock = threading.Lock()
+
+    def fetch(tickers: list[str], start: str, end: str) -> pd.DataFrame:
+        with lock:
+            failed = rng.random() < failure_rate
+        time.sleep(latency + per_ticker * len(tickers))
+        if failed:
+            raise ConnectionError("synthetic throttle")
+        dates = pd.bdate_range(start, end, inclusive="left", name="Date")
+        close = 100.0 * np.cumprod(
+            1.0 + np.random.default_rng(len(tickers)).normal(
+                0.0004, 0.02, size=(len(dates), len(tickers))
+            ),
+            axis=0,
+        )
+        return pd.concat({
+            "Close": pd.DataFrame(close, index=dates, columns=tickers),
+            "Volume": pd.DataFrame(1_000_000, index=dates, columns=tickers),
+        }, axis=1)
+
+    return fetch
+
+
+def bench_price_download(n_tickers: int = 1000) -> None:
+    """Chunked download throughput by chunk size and worker count."""
+    fetch = _synthetic_fetcher(
+        latency=0.2, per_ticker=0.002, failure_rate=0.05
+    )
+    backoff = src.pull_prices.PRICE_RETRY_BACKOFF
+    src.pull_prices.PRICE_RETRY_BACKOFF = 0.05
+    # Retries are counted in the table rather than logged
+    download_logger = logging.getLogger(src.pull_prices.__name__)
+    level = download_logger.level
+    download_logger.setLevel(logging.ERROR)
+    tickers = [f"T{i:05d}" for i in range(n_tickers)]
+
+    print(f"price-download: {n_tickers} tickers x 2y, synthetic fetcher "
+          f"(200 ms + 2 ms/ticker, 5% failures)")
+    print(f"{'chunk':>6} {'workers':>8} {'seconds':>8} {'rows/s':>9} "
+          f"{'retries':>8} {'lost':>5}")
+    try:
+        for chunk_size in (50, 100, 250):
+            for workers in (1, 4, 8):
+                start = time.perf_counter()
+                stats = [
+                    chunk for chunk, _ in src.pull_prices.iter_price_chunks(
+                        tickers, "2024-01-30", "2026-01-30", fetch=fetch,
+                        chunk_size=chunk_size, workers=workers,
+                    )
+                ]
+                elapsed = time.perf_counter() - start
+                rows = sum(chunk.rows for chunk in stats)
+                retries = sum(chunk.attempts - 1 for chunk in stats)
+                lost = -(-n_tickers // chunk_size) - len(stats)
+                print(f"{chunk_size:>6} {workers:>8} {elapsed:>8.2f} "
+                      f"{rows / elapsed:>9.0f} {retries:>8} {lost:>5}")
+    finally:
+        src.pull_prices.PRICE_RETRY_BACKOFF = backoff
+        download_logger.setLevel(level)
+
+
+def bench_price_files(n_tickers: int = 500, n_days: int = 504) -> None:
+    """Bulk file load vs the download upsert path for a full rebuild."""
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range(end="2026-01-30", periods=n_days)
+    with tempfile.TemporaryDirectory() as tmp:
+        for j in range(n_tickers):
+            pd.DataFrame({
+                "date": dates.strftime("%Y-%m-%d"),
+                "adj_close": 100.0 * np.cumprod(
+                    1.0 + rng.normal(0.0004, 0.02, n_days)
+                ),
+                "volume": 1_000_000,
+            }).to_csv(Path(tmp) / f"T{j:05d}.csv", index=False)
+        files = sorted(Path(tmp).glob("*.csv"))
+
+        print(f"price-files: {n_tickers} CSV files x {n_days} days "
+              f"into an empty DB")
+        print(f"{'path':>16} {'seconds':>8} {'rows/s':>9}")
+        with _temporary_database():
+            start = time.perf_counter()
+            for path in files:
+                df = pd.read_csv(path).assign(ticker=path.stem)
+                src.pull_prices._save_prices(df)
+            elapsed = time.perf_counter() - start
+        print(f"{'upsert chunks':>16} {elapsed:>8.2f} "
+              f"{n_tickers * n_days / elapsed:>9.0f}")
+        with _temporary_database():
+            start = time.perf_counter()
+            rows = src.pull_prices.load_price_files(Path(tmp))
+            elapsed = time.perf_counter() - start
+        print(f"{'load_price_files':>16} {elapsed:>8.2f} "
+              f"{rows / elapsed:>9.0f}")
+
+
+def _melt_merge_rows(raw: pd.DataFrame) -> list:
+    """The previous reshape: melt Close and Volume, merge, build row lists."""
+    close_long = raw["Close"].copy().reset_index().melt(
+        id_vars="Date", var_name="ticker", value_name="adj_close"
+    )
+    volume_long = raw["Volume"].copy().reset_index().melt(
+        id_vars="Date", var_name="ticker", value_name="volume"
+    )
+    df = close_long.merge(volume_long, on=["Date", "ticker"])
+    df = df.rename(columns={"Date": "date"})
+    df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
+    df = df.dropna(subset=["adj_close"])
+    df["volume"] = df["volume"].astype("Int64")
+    return df[["ticker", "date", "adj_close", "volume"]].values.tolist()
+
+
+def _array_rows(raw: pd.DataFrame) -> int:
+    """The array reshape, with its executemany parameters consumed."""
+    df = src.pull_prices._to_long(raw, [])
+    return sum(1 for _ in src.pull_prices._price_rows(df))
+
+
+def bench_reshape(n_tickers: int = 3000, n_days: int = 500) -> None:
+    """Wide download -> long rows: melt + merge vs array reshape."""
+    fetch = _synthetic_fetcher(latency=0.0, per_ticker=0.0, failure_rate=0.0)
+    raw = fetch(
+        [f"T{i:05d}" for i in range(n_tickers)],
+        str(pd.Timestamp("2026-01-30") - pd.offsets.BDay(n_days))[:10],
+        "2026-01-31",
+    )
+    # Some gaps, as for tickers listed part-way through the window
+    raw.iloc[: n_days // 10, : n_tickers // 10] = np.nan
+
+    print(f"reshape: {raw.shape[0]} days x {n_tickers} tickers wide frame")
+    print(f"{'method':>12} {'seconds':>8} {'peak MB':>8}")
+    for name, reshape in (
+        ("melt+merge", _melt_merge_rows),
+        ("arrays", _array_rows),
+    ):
+        elapsed = _best_of(lambda: reshape(raw))
+        tracemalloc.start()
+        reshape(raw)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name:>12} {elapsed:>8.3f} {peak / 1e6:>8.1f}")
+
+
+def _replace_list_write(df: pd.DataFrame) -> None:
+    """The previous writer: a materialized row list and INSERT OR REPLACE."""
+    with get_connection() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO price_bars "
+            "(ticker_id, day, adj_close, volume) VALUES (?, ?, ?, ?)",
+            df.values.tolist(),
+        )
+
+
+def _upsert_write(
+    df: pd.DataFrame, batch_size: int, rebuild_indexes: bool = False,
+) -> None:
+    """Stream ``df`` through ``upsert_rows`` in one transaction."""
+    columns = ["ticker_id", "day", "adj_close", "volume"]
+    with get_connection() as conn:
+        upsert_rows(
+            conn, "price_bars", columns, frame_rows(df, columns),
+            key=["ticker_id", "day"], batch_size=batch_size,
+            rebuild_indexes=rebuild_indexes,
+        )
+
+
+def bench_bulk_write(n_tickers: int = 1000, n_days: int = 504) -> None:
+    """Write throughput into price_bars: fresh inserts, then rewrites."""
+    rng = np.random.default_rng(0)
+    bars = pd.DataFrame({
+        "ticker_id": np.repeat(np.arange(1, n_tickers + 1), n_days),
+        "day": np.tile(np.arange(19_000, 19_000 + n_days), n_tickers),
+        "adj_close": rng.uniform(10.0, 500.0, n_tickers * n_days),
+        "volume": 1_000_000,
+    })
+    # Rewrites hit existing keys, as restated or overlapping downloads do
+    restated = bars.assign(adj_close=bars["adj_close"] * 1.01)
+    writers: list[tuple[str, Callable[[pd.DataFrame], None]]] = [
+        ("replace list", _replace_list_write),
+        *(
+            (f"upsert {batch:,}", lambda df, b=batch: _upsert_write(df, b))
+            for batch in (1_000, 10_000, 50_000, 250_000)
+        ),
+        ("upsert reindex", lambda df: _upsert_write(df, 50_000, True)),
+    ]
+
+    print(f"bulk-write: {len(bars):,} price_bars rows "
+          f"({n_tickers} tickers x {n_days} days), one transaction")
+    print(f"{'writer':>16} {'phase':>8} {'seconds':>8} {'rows/s':>9} "
+          f"{'peak MB':>8}")
+    for name, write in writers:
+        # Deferring indexes only pays off when loading an empty table
+        phases = [("insert", bars)]
+        if not name.endswith("reindex"):
+            phases.append(("update", restated))
+        timings = {}
+        with _temporary_database():
+            for phase, df in phases:
+                start = time.perf_counter()
+                write(df)
+                timings[phase] = time.perf_counter() - start
+        # Memory is traced on a second run so it does not skew the timings
+        with _temporary_database():
+            for phase, df in phases:
+                tracemalloc.start()
+                write(df)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                elapsed = timings[phase]
+                print(f"{name:>16} {phase:>8} {elapsed:>8.2f} "
+                      f"{len(df) / elapsed:>9.0f} {peak / 1e6:>8.1f}")
+
+
+BENCHMARKS: dict[str, Callable[[], None]] = {
+    "metrics-workers": bench_metrics_workers,
+    "scoring-profiles": bench_scoring_profiles,
+    "db-connections": bench_db_connections,
+    "db-pragmas": bench_db_pragmas,
+    "query-plans": bench_query_plans,
+    "api-load": bench_api_load,
+    "price-download": bench_price_download,
+    "price-files": bench_price_files,
+    "reshape": bench_reshape,
+    "bulk-write": bench_bulk_write,
+}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -2,126 +2,478 @@
 
 from __future__ import annotations
 
+import hashlib
+import json
 import logging
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import NamedTuple
 
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 
+import src.db
 from src.config import (
+    DIRTY_TICKERS_ONLY,
+    METRIC_WINDOWS,
+    METRICS_FULL_HISTORY,
+    METRICS_BLOCK_TICKERS,
+    METRICS_INCREMENTAL,
+    METRICS_WORKERS,
     MIN_TRADING_DAYS,
     MOMENTUM_3M_WEIGHT,
     MOMENTUM_12M_WEIGHT,
+    PRICE_MATRIX_CACHE,
     TRADING_DAYS_PER_YEAR,
     WINDOW_3M,
     WINDOW_12M,
 )
-from src.db import get_connection, init_db, load_dataframe
+from src.db import (
+    begin_run,
+    clear_dirty,
+    days_to_dates,
+    execute_query,
+    frame_rows,
+    get_connection,
+    get_dirty_tickers,
+    get_latest_date,
+    get_latest_price_date,
+    get_latest_run,
+    get_price_tickers,
+    get_run_metrics_config,
+    init_db,
+    iter_price_blocks,
+    load_dataframe,
+    mark_dirty,
+    upsert_rows,
+)
+from src.matrix_cache import load_price_matrix
 
 logger = logging.getLogger(__name__)
 
+# Running window sums kept per ticker by the incremental path
+_SUM_NAMES = ("ret_sum", "ret_sq_sum", "down_sum", "down_sq_sum")
+
+# Persisted columns of the metrics (less run_id) and metric_state tables
+_METRIC_COLUMNS = [
+    "ticker", "as_of_date", "window_months", "mean_daily_return",
+    "annualized_return", "volatility", "downside_deviation", "max_drawdown",
+    "momentum", "trading_days",
+]
+_STATE_COLUMNS = [
+    "ticker", "window_months", "last_date", "last_close", "bar_count",
+    *_SUM_NAMES, "closes",
+]
+
 
-def _compute_ticker_metrics(
-    prices: pd.DataFrame,
-    window: int = WINDOW_12M,
-) -> dict | None:
+def _pivot_prices(
+    prices_df: pd.DataFrame,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
-    Compute rolling financial metrics for a single ticker.
+    Pivot long-format prices into a dates x tickers close matrix.
 
-    Parameters
-    ----------
-    prices : DataFrame with columns [date, adj_close], sorted by date ascending.
-    window : rolling window in trading days.
+    Returns (dates, tickers, close) where ``close[i, j]`` is the adjusted
+    close of ``tickers[j]`` on ``dates[i]`` and NaN where no bar exists.
+    """
+    date_idx, dates = pd.factorize(prices_df["date"], sort=True)
+    ticker_idx, tickers = pd.factorize(prices_df["ticker"], sort=True)
 
-    Returns a dict of metric values as of the latest date, or None if
-    insufficient history.
+    close = np.full((len(dates), len(tickers)), np.nan)
+    close[date_idx, ticker_idx] = prices_df["adj_close"].to_numpy(dtype=float)
+    return np.asarray(dates), np.asarray(tickers), close
+
+
+def _align_to_last_bar(
+    close: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
-    if len(prices) < MIN_TRADING_DAYS:
-        return None
+    Pack each column's observed bars into the bottom rows of the matrix.
+
+    After packing, row -1 is every ticker's latest bar, row -2 the one
+    before it, and so on, so trailing windows can be sliced for all tickers
+    at once while each ticker still only sees its own consecutive bars
+    (exactly what a per-ticker ``pct_change`` would see). Missing bars
+    become NaN padding at the top.
+
+    Returns (packed close matrix, observed bar count per ticker, order)
+    where ``order[i, j]`` is the date index of packed cell ``(i, j)``.
+    """
+    observed = ~np.isnan(close)
+    counts = observed.sum(axis=0)
+    # Stable sort moves missing cells (False) up and keeps date order
+    order = np.argsort(observed, axis=0, kind="stable")
+    return np.take_along_axis(close, order, axis=0), counts, order
 
-    prices = prices.sort_values("date").reset_index(drop=True)
-    close = prices["adj_close"].astype(float)
 
+def _return_cumsums(close: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Cumulative return sums shared by every window length.
+
+    Row ``i`` holds the sum over packed bars before ``i`` (row 0 is zero),
+    so the sum over any window is the difference of two rows. ``count``
+    tracks real returns so windows reaching into the padding are detected.
+    """
     # Daily returns with shift(1) to prevent look-ahead bias:
     # return on day T = (close_T - close_{T-1}) / close_{T-1}
-    daily_returns = close.pct_change()
+    daily_returns = np.full(close.shape, np.nan)
+    daily_returns[1:] = close[1:] / close[:-1] - 1.0
+    observed = ~np.isnan(daily_returns)
+    returns = np.where(observed, daily_returns, 0.0)
+    negative = np.minimum(returns, 0.0)
+
+    series = {
+        "count": observed.astype(float),
+        "ret_sum": returns,
+        "ret_sq_sum": returns * returns,
+        "down_sum": negative,
+        "down_sq_sum": negative * negative,
+    }
+    zero = np.zeros((1, close.shape[1]))
+    return {
+        name: np.vstack([zero, np.cumsum(values, axis=0)])
+        for name, values in series.items()
+    }
+
+
+def _trailing_sums(
+    cumsums: dict[str, np.ndarray], window: int,
+) -> dict[str, np.ndarray]:
+    """Sums over each ticker's last ``window`` returns (or all, if fewer)."""
+    start = max(cumsums["count"].shape[0] - 1 - window, 0)
+    return {name: values[-1] - values[start] for name, values in cumsums.items()}
+
+
+def _rolling_sums(
+    cumsums: dict[str, np.ndarray], window: int,
+) -> dict[str, np.ndarray]:
+    """Sums over the ``window`` returns ending at every bar."""
+    sums = {}
+    for name, values in cumsums.items():
+        rolled = np.full((values.shape[0] - 1, values.shape[1]), np.nan)
+        rolled[window - 1:] = values[window:] - values[:-window]
+        sums[name] = rolled
+    return sums
+
+
+def _window_statistics(
+    sums: dict[str, np.ndarray], window: int,
+) -> dict[str, np.ndarray]:
+    """
+    Mean return, volatility and downside deviation from window sums.
+
+    Statistics are NaN unless the window holds ``window`` real returns,
+    matching ``rolling(window)`` semantics.
+    """
+    full = sums["count"] == window
+
+    def _std(total: np.ndarray, sq_total: np.ndarray) -> np.ndarray:
+        var = np.maximum(sq_total - total * total / window, 0.0) / (window - 1)
+        return np.where(full, np.sqrt(var), np.nan)
 
     # ── Mean daily return (rolling) ──────────────────────────────────────
-    rolling_mean = daily_returns.rolling(window).mean()
-    mean_daily = rolling_mean.iloc[-1]
+    mean_daily = np.where(full, sums["ret_sum"] / window, np.nan)
 
     # ── Annualized return ────────────────────────────────────────────────
     annualized_return = (1 + mean_daily) ** TRADING_DAYS_PER_YEAR - 1
 
     # ── Volatility (annualized std dev) ──────────────────────────────────
-    rolling_std = daily_returns.rolling(window).std()
-    volatility = rolling_std.iloc[-1] * np.sqrt(TRADING_DAYS_PER_YEAR)
+    volatility = (
+        _std(sums["ret_sum"], sums["ret_sq_sum"])
+        * np.sqrt(TRADING_DAYS_PER_YEAR)
+    )
 
     # ── Downside deviation (annualized) ──────────────────────────────────
-    negative_returns = daily_returns.copy()
-    negative_returns[negative_returns > 0] = 0.0
-    rolling_downside_std = negative_returns.rolling(window).std()
-    downside_deviation = rolling_downside_std.iloc[-1] * np.sqrt(TRADING_DAYS_PER_YEAR)
-
-    # ── Max drawdown (rolling window) ────────────────────────────────────
-    # Use the trailing `window` days of close prices.
-    trailing_close = close.iloc[-window:]
-    cummax = trailing_close.cummax()
-    drawdown = (trailing_close - cummax) / cummax
-    max_drawdown = drawdown.min()  # most negative value
-
-    # ── Momentum: blended 3-month and 12-month return ────────────────────
-    def _period_return(n_days: int) -> float:
-        if len(close) < n_days + 1:
-            return 0.0
-        return (close.iloc[-1] / close.iloc[-n_days - 1]) - 1.0
-
-    ret_3m = _period_return(WINDOW_3M)
-    ret_12m = _period_return(WINDOW_12M)
-    momentum = MOMENTUM_3M_WEIGHT * ret_3m + MOMENTUM_12M_WEIGHT * ret_12m
+    downside_deviation = (
+        _std(sums["down_sum"], sums["down_sq_sum"])
+        * np.sqrt(TRADING_DAYS_PER_YEAR)
+    )
 
     return {
         "mean_daily_return": mean_daily,
         "annualized_return": annualized_return,
         "volatility": volatility,
         "downside_deviation": downside_deviation,
-        "max_drawdown": max_drawdown,
-        "momentum": momentum,
-        "trading_days": len(prices),
     }
 
 
-def compute_all_metrics(window_months: int = 12) -> pd.DataFrame:
+def _trailing_max_drawdown(close: np.ndarray, window: int) -> np.ndarray:
+    """Max drawdown over each ticker's trailing ``window`` bars."""
+    # fmax skips the NaN padding of short histories
+    trailing_close = close[-window:]
+    cummax = np.fmax.accumulate(trailing_close, axis=0)
+    drawdown = (trailing_close - cummax) / cummax
+    return np.fmin.reduce(drawdown, axis=0)  # most negative value
+
+
+def _rolling_max_drawdown(
+    close: np.ndarray,
+    window: int,
+    max_block: int = 4_000_000,
+) -> np.ndarray:
     """
-    Compute metrics for every ticker in the prices table.
+    Max drawdown over the trailing ``window`` bars ending at every row.
 
-    Returns a DataFrame ready for insertion into the metrics table.
+    Windows are materialized as strided views and reduced a block of
+    tickers at a time, so peak memory stays near ``max_block`` floats.
     """
-    window = {12: WINDOW_12M, 6: 126, 3: 63}.get(window_months, WINDOW_12M)
+    n_bars, n_tickers = close.shape
+    padded = np.vstack([np.full((window - 1, n_tickers), np.nan), close])
+    out = np.empty(close.shape)
+    step = max(1, max_block // (n_bars * window))
+
+    for lo in range(0, n_tickers, step):
+        hi = min(lo + step, n_tickers)
+        # (bars, tickers, window) view; fmax/fmin skip the NaN padding
+        windows = sliding_window_view(padded[:, lo:hi], window, axis=0)
+        cummax = np.fmax.accumulate(windows, axis=-1)
+        drawdown = (windows - cummax) / cummax
+        out[:, lo:hi] = np.fmin.reduce(drawdown, axis=-1)
+
+    return out
+
+
+def _period_return(
+    close: np.ndarray, counts: np.ndarray, n_days: int,
+) -> np.ndarray:
+    """Return over the last ``n_days`` bars, or 0.0 with too little history."""
+    if close.shape[0] < n_days + 1:
+        return np.zeros(close.shape[1])
+    ret = close[-1] / close[-n_days - 1] - 1.0
+    return np.where(counts >= n_days + 1, ret, 0.0)
+
+
+def _momentum(close: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Blended 3-month and 12-month return as of each ticker's last bar."""
+    return (
+        MOMENTUM_3M_WEIGHT * _period_return(close, counts, WINDOW_3M)
+        + MOMENTUM_12M_WEIGHT * _period_return(close, counts, WINDOW_12M)
+    )
+
 
-    prices_df = load_dataframe(
-        "SELECT ticker, date, adj_close FROM prices ORDER BY ticker, date"
+def _rolling_momentum(close: np.ndarray) -> np.ndarray:
+    """Blended 3-month and 12-month return as of every bar."""
+    def _period_returns(n_days: int) -> np.ndarray:
+        prior = np.full(close.shape, np.nan)
+        prior[n_days:] = close[:-n_days]
+        return np.where(np.isnan(prior), 0.0, close / prior - 1.0)
+
+    return (
+        MOMENTUM_3M_WEIGHT * _period_returns(WINDOW_3M)
+        + MOMENTUM_12M_WEIGHT * _period_returns(WINDOW_12M)
     )
 
-    if prices_df.empty:
-        logger.warning("No price data found in database")
-        return pd.DataFrame()
 
-    as_of_date = prices_df["date"].max()
-    rows: list[dict] = []
-    skipped: list[str] = []
+def _compute_matrix_metrics(
+    close: np.ndarray,
+    counts: np.ndarray,
+    windows: dict[int, int],
+) -> dict[int, dict[str, np.ndarray]]:
+    """
+    Compute rolling financial metrics for every ticker and window at once.
 
-    for ticker, group in prices_df.groupby("ticker"):
-        result = _compute_ticker_metrics(group, window=window)
-        if result is None:
-            skipped.append(ticker)
-            continue
+    Parameters
+    ----------
+    close : packed close matrix (bars x tickers) from ``_align_to_last_bar``.
+    counts : number of observed bars per ticker.
+    windows : window length in trading days, keyed by window_months.
 
-        rows.append({
-            "ticker": ticker,
-            "as_of_date": as_of_date,
-            "window_months": window_months,
-            **result,
-        })
+    Returns metric arrays (one value per ticker, as of each ticker's latest
+    bar) keyed by window_months. Returns, their cumulative sums and the
+    momentum blend are computed once and shared by all windows.
+    """
+    cumsums = _return_cumsums(close)
+    momentum = _momentum(close, counts)
+
+    return {
+        window_months: {
+            **_window_statistics(_trailing_sums(cumsums, window), window),
+            "max_drawdown": _trailing_max_drawdown(close, window),
+            "momentum": momentum,
+        }
+        for window_months, window in windows.items()
+    }
+
+
+def _compute_matrix_history(
+    close: np.ndarray,
+    windows: dict[int, int],
+) -> dict[int, dict[str, np.ndarray]]:
+    """
+    Compute rolling financial metrics as of every bar for every ticker.
+
+    Same definitions as ``_compute_matrix_metrics`` but evaluated at each
+    row of the packed close matrix: window sums and sums of squares are
+    differences of cumulative sums, so the whole history costs one linear
+    pass instead of one recomputation per date.
+
+    Returns (bars x tickers) metric matrices keyed by window_months.
+    """
+    cumsums = _return_cumsums(close)
+    momentum = _rolling_momentum(close)
+
+    return {
+        window_months: {
+            **_window_statistics(_rolling_sums(cumsums, window), window),
+            "max_drawdown": _rolling_max_drawdown(close, window),
+            "momentum": momentum,
+        }
+        for window_months, window in windows.items()
+    }
+
+
+def _resolve_windows(window_months: int | Iterable[int]) -> dict[int, int]:
+    """Map window lengths in months to trading days (default 12 months)."""
+    if isinstance(window_months, int):
+        window_months = (window_months,)
+    return {
+        months: METRIC_WINDOWS.get(months, WINDOW_12M)
+        for months in window_months
+    }
+
+
+def _init_worker(db_path: str) -> None:
+    """Point a metrics worker process at the parent's database file."""
+    src.db.DB_PATH = Path(db_path)
+
+
+def _price_blocks(
+    tickers: Sequence[str] | None = None,
+    block_size: int = METRICS_BLOCK_TICKERS,
+) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Yield (dates, tickers, close) matrices one block of tickers at a time.
+
+    Blocks are column slices of the memory-mapped matrix cache when
+    ``PRICE_MATRIX_CACHE`` is set, otherwise pivots of prices streamed
+    from SQLite. Streams every ticker unless ``tickers`` is given.
+    """
+    if not PRICE_MATRIX_CACHE:
+        for block in iter_price_blocks(block_size, tickers):
+            yield _pivot_prices(block)
+        return
+
+    matrix = load_price_matrix()
+    if matrix is None:
+        return
+
+    columns = np.arange(len(matrix.tickers))
+    if tickers is not None:
+        # Requested tickers without bars have no column
+        columns = pd.Index(matrix.tickers).get_indexer(sorted(tickers))
+        columns = columns[columns >= 0]
+
+    for start in range(0, len(columns), block_size):
+        block = columns[start:start + block_size]
+        yield matrix.dates, matrix.tickers[block], matrix.close[:, block]
+
+
+def _compute_block(
+    dates: np.ndarray,
+    tickers: np.ndarray,
+    close: np.ndarray,
+    windows: dict[int, int],
+) -> dict:
+    """Compute latest metrics for one block's dates x tickers matrix."""
+    close, counts, _ = _align_to_last_bar(close)
+    eligible = counts >= MIN_TRADING_DAYS
+
+    return {
+        "as_of_date": dates[-1],
+        "tickers": tickers[eligible],
+        "counts": counts[eligible],
+        "skipped": tickers[~eligible],
+        "metrics": _compute_matrix_metrics(
+            close[:, eligible], counts[eligible], windows
+        ),
+    }
+
+
+def _compute_shard(
+    tickers: Sequence[str] | None,
+    windows: dict[int, int],
+    block_size: int = METRICS_BLOCK_TICKERS,
+) -> list[dict]:
+    """
+    Compute latest metrics for one shard of tickers (all when None).
+
+    Prices are streamed a block of tickers at a time, so memory is bounded
+    by the block size. Under sharding this runs in a worker process and
+    returns only compact per-ticker arrays to the parent. Requested
+    tickers without bars (say, queued when their prices were deleted)
+    yield empty blocks, which are skipped.
+    """
+    return [
+        _compute_block(dates, block_tickers, close, windows)
+        for dates, block_tickers, close in _price_blocks(tickers, block_size)
+        if len(block_tickers)
+    ]
+
+
+def compute_all_metrics(
+    window_months: int | Iterable[int] = tuple(METRIC_WINDOWS),
+    workers: int = METRICS_WORKERS,
+    tickers: Sequence[str] | None = None,
+) -> pd.DataFrame:
+    """
+    Compute metrics for every ticker in the prices table (or ``tickers``).
+
+    Prices are pivoted into a single dates x tickers matrix, and every
+    metric is evaluated for all tickers and all requested windows at once,
+    so cost scales with the matrix size rather than with a per-ticker
+    Python loop. Prices are streamed in blocks of tickers rather than
+    loaded as one table. With ``workers > 1`` tickers are split into
+    contiguous shards computed in a process pool; every metric is
+    column-independent, so the result is identical to the serial path.
+
+    Returns a DataFrame ready for insertion into the metrics table.
+    """
+    windows = _resolve_windows(window_months)
+
+    if workers > 1:
+        universe = np.asarray(
+            sorted(tickers) if tickers is not None else get_price_tickers()
+        )
+        shards = [
+            shard.tolist()
+            for shard in np.array_split(universe, workers) if len(shard)
+        ]
+        if PRICE_MATRIX_CACHE:
+            load_price_matrix()  # build once before workers map it
+        results = []
+        if shards:
+            with ProcessPoolExecutor(
+                max_workers=len(shards),
+                initializer=_init_worker,
+                initargs=(str(src.db.DB_PATH),),
+            ) as pool:
+                for shard_results in pool.map(
+                    _compute_shard, shards, repeat(windows)
+                ):
+                    results.extend(shard_results)
+        logger.info("Computed %d shards across %d workers", len(shards), workers)
+    else:
+        results = _compute_shard(tickers, windows)
+
+    if not results:
+        logger.warning("No price data found in database")
+        return pd.DataFrame()
+
+    as_of_date = max(result["as_of_date"] for result in results)
+    if tickers is not None:
+        as_of_date = get_latest_price_date()
+    tickers = np.concatenate([result["tickers"] for result in results])
+    counts = np.concatenate([result["counts"] for result in results])
+    skipped = np.concatenate([result["skipped"] for result in results]).tolist()
+    metrics = {
+        months: {
+            name: np.concatenate([r["metrics"][months][name] for r in results])
+            for name in results[0]["metrics"][months]
+        }
+        for months in windows
+    }
 
     if skipped:
         logger.info(
@@ -131,39 +483,533 @@ def compute_all_metrics(window_months: int = 12) -> pd.DataFrame:
             ", ".join(skipped[:10]) + ("..." if len(skipped) > 10 else ""),
         )
 
-    logger.info("Computed metrics for %d tickers (as of %s)", len(rows), as_of_date)
-    return pd.DataFrame(rows)
+    df = pd.concat(
+        [
+            pd.DataFrame({
+                "ticker": tickers,
+                "as_of_date": as_of_date,
+                "window_months": months,
+                **values,
+                "trading_days": counts,
+            })
+            for months, values in metrics.items()
+        ],
+        ignore_index=True,
+    )
+
+    logger.info(
+        "Computed metrics for %d tickers over %d windows (as of %s)",
+        len(tickers),
+        len(windows),
+        as_of_date,
+    )
+    return df
+
+
+def _history_block(
+    dates: np.ndarray,
+    tickers: np.ndarray,
+    close: np.ndarray,
+    windows: dict[int, int],
+) -> pd.DataFrame:
+    """Compute the metric history for one block's dates x tickers matrix."""
+    close, counts, order = _align_to_last_bar(close)
+    metrics = _compute_matrix_history(close, windows)
+
+    # Bars observed up to and including each packed row
+    n_bars = close.shape[0]
+    bars = np.arange(1, n_bars + 1)[:, None] - (n_bars - counts)[None, :]
+    col, row = np.nonzero((bars >= MIN_TRADING_DAYS).T)
+
+    return pd.concat(
+        [
+            pd.DataFrame({
+                "ticker": tickers[col],
+                "as_of_date": dates[order[row, col]],
+                "window_months": months,
+                **{name: matrix[row, col] for name, matrix in values.items()},
+                "trading_days": bars[row, col],
+            })
+            for months, values in metrics.items()
+        ],
+        ignore_index=True,
+    )
+
+
+def compute_metric_history(
+    window_months: int | Iterable[int] = tuple(METRIC_WINDOWS),
+) -> pd.DataFrame:
+    """
+    Compute metrics as of every trading date for every ticker.
+
+    Each row only uses prices up to its ``as_of_date``; a ticker enters the
+    history once it has ``MIN_TRADING_DAYS`` bars. Prices are processed a
+    block of tickers at a time.
+
+    Returns a DataFrame ready for insertion into the metrics table.
+    """
+    windows = _resolve_windows(window_months)
+    frames = [_history_block(*block, windows) for block in _price_blocks()]
+
+    if not frames:
+        logger.warning("No price data found in database")
+        return pd.DataFrame()
+
+    df = pd.concat(frames, ignore_index=True)
+    logger.info(
+        "Computed metric history for %d tickers across %d dates",
+        df["ticker"].nunique(),
+        df["as_of_date"].nunique(),
+    )
+    return df
+
+
+def _state_length(window: int) -> int:
+    """Closes kept in the running state: one window plus 12M momentum."""
+    return max(window, WINDOW_12M) + 1
+
+
+def _init_window_state(
+    close: np.ndarray, counts: np.ndarray, window: int,
+) -> dict[str, np.ndarray]:
+    """
+    Build running window state from a packed close matrix.
+
+    The state holds the sums needed for the mean and standard deviations
+    of the trailing ``window`` returns, plus a buffer of the most recent
+    closes for drawdown, momentum and for retiring old returns.
+    """
+    length = _state_length(window)
+    sums = _trailing_sums(_return_cumsums(close), window)
+
+    closes = close[-length:]
+    if closes.shape[0] < length:
+        padding = np.full((length - closes.shape[0], close.shape[1]), np.nan)
+        closes = np.vstack([padding, closes])
+
+    return {
+        "bar_count": counts.astype(np.int64),
+        **{name: sums[name] for name in _SUM_NAMES},
+        "closes": closes,
+    }
+
+
+def _advance_window_state(
+    state: dict[str, np.ndarray], new_close: np.ndarray, window: int,
+) -> None:
+    """
+    Roll running window state forward through newly arrived bars in place.
+
+    ``new_close`` is a packed (new bars x tickers) matrix aligned with the
+    state columns. Each bar adds its return to the window sums and retires
+    the return leaving the window. The close buffer is advanced as a ring,
+    each ticker writing over its own oldest close, and put back in date
+    order once at the end, so the cost is O(tickers x new bars) plus one
+    pass over the buffer.
+    """
+    ring = state["closes"].copy()
+    length, n_tickers = ring.shape
+    cols = np.arange(n_tickers)
+    # Row of each ticker's latest close; closes[-k] is ring[head - k + 1]
+    head = np.full(n_tickers, length - 1)
+
+    for bar in new_close:
+        arrived = ~np.isnan(bar)
+        if not arrived.any():
+            continue
+
+        ret = np.where(arrived, bar / ring[head, cols] - 1.0, 0.0)
+        # Once the window holds `window` returns the oldest one drops out
+        full = arrived & (state["bar_count"] - 1 >= window)
+        leaving = np.where(
+            full,
+            ring[(head - window + 1) % length, cols]
+            / ring[(head - window) % length, cols] - 1.0,
+            0.0,
+        )
+        down, down_leaving = np.minimum(ret, 0.0), np.minimum(leaving, 0.0)
+
+        state["ret_sum"] += ret - leaving
+        state["ret_sq_sum"] += ret * ret - leaving * leaving
+        state["down_sum"] += down - down_leaving
+        state["down_sq_sum"] += down * down - down_leaving * down_leaving
+        head = np.where(arrived, (head + 1) % length, head)
+        ring[head[arrived], cols[arrived]] = bar[arrived]
+        state["bar_count"] += arrived
+
+    rows = (head + 1 + np.arange(length)[:, None]) % length
+    state["closes"] = np.take_along_axis(ring, rows, axis=0)
+
+
+def _metrics_from_state(
+    state: dict[str, np.ndarray], window: int,
+) -> dict[str, np.ndarray]:
+    """Derive the metric arrays from running window state."""
+    sums = {
+        "count": np.minimum(state["bar_count"] - 1, window),
+        **{name: state[name] for name in _SUM_NAMES},
+    }
+    closes, counts = state["closes"], state["bar_count"]
+
+    return {
+        **_window_statistics(sums, window),
+        "max_drawdown": _trailing_max_drawdown(closes, window),
+        "momentum": _momentum(closes, counts),
+    }
+
+
+def _load_window_state(
+    window_months: int, length: int,
+) -> tuple[pd.DataFrame, dict[str, np.ndarray]]:
+    """
+    Load persisted window state for every ticker.
+
+    Returns (index, state) where ``index`` has ticker, last_date and a
+    ``stale`` flag set when the stored close for ``last_date`` no longer
+    matches the prices table (e.g. after a split or dividend adjustment).
+    """
+    rows = load_dataframe(
+        """
+        SELECT s.ticker, s.last_date, s.last_close, b.adj_close,
+               s.bar_count, s.ret_sum, s.ret_sq_sum, s.down_sum,
+               s.down_sq_sum, s.closes
+        FROM metric_state s
+        LEFT JOIN tickers t ON t.symbol = s.ticker
+        LEFT JOIN price_bars b
+            ON b.ticker_id = t.id
+            AND b.day = CAST(strftime('%s', s.last_date) AS INTEGER) / 86400
+        WHERE s.window_months = ?
+        ORDER BY s.ticker
+        """,
+        (window_months,),
+    )
+
+    closes = np.full((length, len(rows)), np.nan)
+    for j, blob in enumerate(rows["closes"]):
+        buffer = np.frombuffer(blob, dtype=np.float64)[-length:]
+        closes[length - len(buffer):, j] = buffer
+
+    index = rows[["ticker", "last_date"]].copy()
+    index["stale"] = (rows["adj_close"] != rows["last_close"]).to_numpy()
+    state = {
+        "bar_count": rows["bar_count"].to_numpy(dtype=np.int64),
+        **{name: rows[name].to_numpy(dtype=float) for name in _SUM_NAMES},
+        "closes": closes,
+    }
+    return index, state
+
+
+def _select_state(
+    state: dict[str, np.ndarray], mask: np.ndarray,
+) -> dict[str, np.ndarray]:
+    """Subset every state array to the tickers selected by ``mask``."""
+    return {
+        name: values[:, mask] if values.ndim == 2 else values[mask]
+        for name, values in state.items()
+    }
+
+
+def _advance_window_metrics(
+    window_months: int, window: int, rebuild: bool = False,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Advance one window's persisted state by its new bars."""
+    length = _state_length(window)
+    index, state = _load_window_state(window_months, length)
+
+    # ── Advance known tickers through their new bars ────────────────────
+    keep = ~index["stale"].to_numpy() & (not rebuild)
+    index, state = index[keep].reset_index(drop=True), _select_state(state, keep)
+
+    new_rows = load_dataframe(
+        """
+        SELECT s.ticker, b.day, b.adj_close
+        FROM metric_state s
+        JOIN tickers t ON t.symbol = s.ticker
+        JOIN price_bars b
+            ON b.ticker_id = t.id
+            AND b.day > CAST(strftime('%s', s.last_date) AS INTEGER) / 86400
+        WHERE s.window_months = ?
+        ORDER BY s.ticker, b.day
+        """,
+        (window_months,),
+    )
+    new_rows.insert(1, "date", days_to_dates(new_rows.pop("day")))
+    new_rows = new_rows[new_rows["ticker"].isin(index["ticker"])]
+    updated = index["ticker"].isin(new_rows["ticker"]).to_numpy()
+
+    if not new_rows.empty:
+        dates, tickers, new_close = _pivot_prices(new_rows)
+        new_close, _, order = _align_to_last_bar(new_close)
+        columns = pd.Index(index["ticker"]).get_indexer(tickers)
+        aligned = np.full((new_close.shape[0], len(index)), np.nan)
+        aligned[:, columns] = new_close
+        _advance_window_state(state, aligned, window)
+        index.loc[columns, "last_date"] = dates[order[-1]]
+
+    # ── Rebuild tickers with no usable state from full history ──────────
+    missing = sorted(set(get_price_tickers()) - set(index["ticker"]))
+
+    if missing:
+        # One block of tickers' history at a time, keeping only its state
+        indexes, states, updates = [index], [state], [updated]
+        for prices_df in iter_price_blocks(tickers=missing):
+            dates, tickers, close = _pivot_prices(prices_df)
+            close, counts, order = _align_to_last_bar(close)
+            states.append(_init_window_state(close, counts, window))
+            indexes.append(pd.DataFrame({
+                "ticker": tickers, "last_date": dates[order[-1]],
+            }))
+            updates.append(np.ones(len(tickers), dtype=bool))
+
+        index = pd.concat(indexes, ignore_index=True)
+        state = {
+            name: np.concatenate(
+                [block[name] for block in states], axis=values.ndim - 1
+            )
+            for name, values in state.items()
+        }
+        updated = np.concatenate(updates)
+        logger.info(
+            "Rebuilt window state for %d tickers", len(index) - len(updates[0])
+        )
+
+    if index.empty:
+        logger.warning("No price data found in database")
+        return pd.DataFrame(), pd.DataFrame()
+
+    logger.info(
+        "Advanced %d-month window state for %d tickers (%d new bars)",
+        window_months,
+        int(updated.sum()) - len(missing),
+        len(new_rows),
+    )
+
+    # ── Metrics from state ───────────────────────────────────────────────
+    as_of_date = index["last_date"].max()
+    eligible = state["bar_count"] >= MIN_TRADING_DAYS
+    metrics = _metrics_from_state(_select_state(state, eligible), window)
+    metrics_df = pd.DataFrame({
+        "ticker": index["ticker"].to_numpy()[eligible],
+        "as_of_date": as_of_date,
+        "window_months": window_months,
+        **metrics,
+        "trading_days": state["bar_count"][eligible],
+    })
+
+    # ── State rows for tickers that changed ──────────────────────────────
+    changed = _select_state(state, updated)
+    closes = changed.pop("closes")
+    state_df = pd.DataFrame({
+        "ticker": index["ticker"].to_numpy()[updated],
+        "window_months": window_months,
+        "last_date": index["last_date"].to_numpy()[updated],
+        "last_close": closes[-1],
+        **changed,
+        "closes": [
+            column[~np.isnan(column)].tobytes() for column in closes.T
+        ],
+    })
+
+    return metrics_df, state_df
+
+
+def compute_incremental_metrics(
+    window_months: int | Iterable[int] = tuple(METRIC_WINDOWS),
+    rebuild: bool = False,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Compute metrics by advancing persisted window state with new bars.
+
+    Only prices newer than each ticker's stored state are read. Tickers
+    without state, or whose stored history was rewritten, are rebuilt from
+    their full price history; with ``rebuild`` every ticker is.
+
+    Returns (metrics, state) DataFrames ready for insertion into the
+    metrics and metric_state tables.
+    """
+    results = [
+        _advance_window_metrics(months, window, rebuild)
+        for months, window in _resolve_windows(window_months).items()
+    ]
+    metrics_df = pd.concat([m for m, _ in results], ignore_index=True)
+    state_df = pd.concat([s for _, s in results], ignore_index=True)
+
+    if not metrics_df.empty:
+        logger.info(
+            "Computed metrics for %d tickers over %d windows (as of %s)",
+            metrics_df["ticker"].nunique(),
+            len(results),
+            metrics_df["as_of_date"].max(),
+        )
+    return metrics_df, state_df
+
+
+def _covers_metric_windows(run_id: int, as_of_date: str) -> bool:
+    """True if ``run_id`` has metrics for every window at ``as_of_date``."""
+    rows = execute_query(
+        """
+        SELECT DISTINCT window_months FROM metrics
+        WHERE run_id = ? AND as_of_date = ?
+        """,
+        (run_id, as_of_date),
+        readonly=True,
+    )
+    return set(METRIC_WINDOWS) <= {row[0] for row in rows}
+
 
+def metrics_config_fingerprint() -> str:
+    """
+    Fingerprint the settings that determine metric values.
 
-def refresh_metrics() -> None:
-    """Main entry point: compute metrics and upsert into DB."""
+    Recorded with each run, so ``refresh_metrics`` can tell when carried
+    forward metrics (or stored window state) were computed differently.
+    """
+    settings = {
+        "windows": METRIC_WINDOWS,
+        "min_trading_days": MIN_TRADING_DAYS,
+        "trading_days_per_year": TRADING_DAYS_PER_YEAR,
+        "momentum": [
+            MOMENTUM_3M_WEIGHT, MOMENTUM_12M_WEIGHT, WINDOW_3M, WINDOW_12M,
+        ],
+    }
+    return hashlib.sha256(
+        json.dumps(settings, sort_keys=True).encode()
+    ).hexdigest()[:16]
+
+
+class MetricsRun(NamedTuple):
+    """Metrics produced by one ``refresh_metrics`` call."""
+
+    run_id: int | None      # None when the metrics were not persisted
+    metrics: pd.DataFrame   # computed and carried-forward rows
+
+
+def _carried_metrics(
+    base_run: int, previous: str, as_of_date: str, dirty: Sequence[str],
+) -> pd.DataFrame:
+    """Metrics of ``base_run`` for tickers not in ``dirty``."""
+    carried = load_dataframe(
+        f"""
+        SELECT {", ".join(_METRIC_COLUMNS)}
+        FROM metrics
+        WHERE run_id = ? AND as_of_date = ?
+        """,  # noqa: S608
+        (base_run, previous),
+    )
+    return carried[~carried["ticker"].isin(dirty)].assign(
+        as_of_date=as_of_date
+    )
+
+
+def refresh_metrics(
+    full_history: bool = METRICS_FULL_HISTORY,
+    incremental: bool = METRICS_INCREMENTAL,
+    dirty_only: bool = DIRTY_TICKERS_ONLY,
+    persist: bool = True,
+    full: bool = False,
+) -> MetricsRun | None:
+    """
+    Main entry point: compute metrics and upsert into DB.
+
+    With ``full_history`` every trading date is persisted, not just the
+    latest one. Otherwise ``incremental`` advances the persisted window
+    state with new bars instead of recomputing from the full history, and
+    ``dirty_only`` recomputes just the tickers whose prices changed since
+    the last run, carrying every other ticker's metrics forward. Processed
+    tickers are queued for the scores stage.
+
+    ``full`` recomputes every ticker from its full price history, ignoring
+    dirty tracking and stored window state. This also happens when the
+    metric settings differ from those of the last run (see
+    ``metrics_config_fingerprint``), so one snapshot never mixes formulas.
+
+    Metrics are written under a new pipeline run, which readers only see
+    once ``refresh_scores`` publishes it. Without ``persist`` nothing is
+    written and the dirty queues are left for the next persisted run.
+    Returns the run's metrics, or None if there was nothing to compute.
+    """
     init_db()
-    df = compute_all_metrics()
+    state_df = pd.DataFrame()
+    carried = pd.DataFrame(columns=_METRIC_COLUMNS)
+
+    config = metrics_config_fingerprint()
+    base_run = get_latest_run("metrics")
+    if (
+        not full and base_run is not None
+        and get_run_metrics_config(base_run) != config
+    ):
+        logger.info(
+            "Metric settings changed since run %d; recomputing all tickers",
+            base_run,
+        )
+        full = True
+    previous = (
+        get_latest_date("metrics", "as_of_date", run_id=base_run)
+        if base_run is not None else None
+    )
+    dirty = get_dirty_tickers("metrics")
+    if full_history:
+        df = compute_metric_history()
+    elif incremental:
+        df, state_df = compute_incremental_metrics(rebuild=full)
+    elif (
+        dirty_only and not full and previous
+        and _covers_metric_windows(base_run, previous)
+    ):
+        if not dirty:
+            logger.info("No tickers changed since the last run")
+            return None
+        logger.info("Recomputing metrics for %d changed tickers", len(dirty))
+        df = compute_all_metrics(tickers=dirty)
+        # Unchanged tickers keep their metrics under the new date
+        carried = _carried_metrics(
+            base_run, previous, get_latest_price_date(), dirty
+        )
+        logger.info(
+            "Carried forward %d unchanged metric rows", len(carried)
+        )
+    else:
+        df = compute_all_metrics()
 
-    if df.empty:
+    if df.empty and carried.empty:
         logger.warning("No metrics to save")
-        return
+        return None
+
+    metrics = pd.concat(
+        [frame for frame in (df, carried) if not frame.empty],
+        ignore_index=True,
+    )
+    if not persist:
+        return MetricsRun(None, metrics)
 
     with get_connection() as conn:
-        conn.executemany(
-            """
-            INSERT OR REPLACE INTO metrics
-                (ticker, as_of_date, window_months, mean_daily_return,
-                 annualized_return, volatility, downside_deviation,
-                 max_drawdown, momentum, trading_days)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            df[
-                [
-                    "ticker", "as_of_date", "window_months",
-                    "mean_daily_return", "annualized_return", "volatility",
-                    "downside_deviation", "max_drawdown", "momentum",
-                    "trading_days",
-                ]
-            ].values.tolist(),
+        run_id = begin_run(conn, config)
+        if not state_df.empty:
+            upsert_rows(
+                conn,
+                "metric_state",
+                _STATE_COLUMNS,
+                frame_rows(state_df, _STATE_COLUMNS),
+                key=["ticker", "window_months"],
+            )
+
+        upsert_rows(
+            conn,
+            "metrics",
+            ["run_id", *_METRIC_COLUMNS],
+            frame_rows(
+                metrics.assign(run_id=run_id), ["run_id", *_METRIC_COLUMNS]
+            ),
+            key=["run_id", "ticker", "as_of_date", "window_months"],
         )
 
-    logger.info("Saved metrics for %d tickers", len(df))
+        if not df.empty:
+            mark_dirty(conn, df["ticker"].unique(), "scores")
+        # Tickers queued since ``dirty`` was read stay queued
+        clear_dirty(conn, "metrics", dirty)
+
+    logger.info("Saved %d metric rows under run %d", len(metrics), run_id)
+    return MetricsRun(run_id, metrics)
 
 
 if __name__ == "__main__":
@@ -6,11 +6,17 @@ from pathlib import Path
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 DATA_DIR = PROJECT_ROOT / "data"
 DB_PATH = DATA_DIR / "market.db"
+MATRIX_CACHE_DIR = DATA_DIR / "matrix_cache"
+PRICE_CACHE_DIR = DATA_DIR / "price_cache"
 
 # ── Ticker Universe ──────────────────────────────────────────────────────────
 # Set to a non-empty list to override automatic S&P 500 fetch.
 CUSTOM_TICKERS: list[str] = []
 
+# The scraped S&P 500 universe is stored in the universe table and only
+# re-scraped once it is older than this. Custom and default lists are not.
+UNIVERSE_TTL_HOURS = 24
+
 DEFAULT_TICKERS: list[str] = [
     "AAPL", "MSFT", "AMZN", "GOOGL", "META", "NVDA", "TSLA", "BRK-B",
     "JPM", "JNJ", "V", "UNH", "PG", "HD", "MA", "DIS", "BAC", "XOM",
@@ -22,12 +28,69 @@ DEFAULT_TICKERS: list[str] = [
 HISTORY_YEARS = 2
 PRICE_INTERVAL = "1d"
 
+# Tickers already stored are only downloaded from their latest date, less
+# this many calendar days of overlap so restated closes (dividend and split
+# adjustments) are noticed and trigger a full-history re-download.
+PRICE_OVERLAP_DAYS = 5
+
+# Downloads are split into chunks of tickers fetched concurrently; a failed
+# chunk is retried with exponential backoff (seconds, doubling per attempt)
+# before it is given up on, without losing the other chunks.
+PRICE_CHUNK_SIZE = 100
+PRICE_DOWNLOAD_WORKERS = 4
+PRICE_DOWNLOAD_ATTEMPTS = 4
+PRICE_RETRY_BACKOFF = 2.0
+
+# Keep each ticker's raw download on disk (see src.download_cache) so a
+# rerun within the TTL reads it back instead of hitting the network; the
+# oldest entries are evicted beyond the size cap.
+PRICE_CACHE = True
+PRICE_CACHE_TTL_HOURS = 12
+PRICE_CACHE_MAX_MB = 512
+
+# Directory of CSV or Parquet price files to bulk-load instead of
+# downloading, for network-free rebuilds (see pull_prices.load_price_files).
+# Parquet files need the optional pyarrow package (pip install pyarrow).
+# None downloads from Yahoo Finance.
+PRICE_SOURCE_DIR: Path | None = None
+
 # ── Rolling Windows ──────────────────────────────────────────────────────────
 TRADING_DAYS_PER_YEAR = 252
 WINDOW_12M = 252
 WINDOW_6M = 126
 WINDOW_3M = 63
 
+# Windows (keyed by window_months) written to the metrics table on every
+# run, and the one risk-profile scores are computed from.
+METRIC_WINDOWS: dict[int, int] = {3: WINDOW_3M, 6: WINDOW_6M, 12: WINDOW_12M}
+SCORING_WINDOW_MONTHS = 12
+
+# ── Metric History ───────────────────────────────────────────────────────────
+# Persist metrics (and scores) for every trading date instead of only the
+# latest one, so historical rankings can be queried.
+METRICS_FULL_HISTORY = False
+
+# Advance persisted per-ticker window state with newly inserted bars rather
+# than recomputing every window from the full price history.
+METRICS_INCREMENTAL = False
+
+# ── Metric Computation ───────────────────────────────────────────────────────
+# Worker processes for metric computation; tickers are sharded across them.
+# 1 computes everything in-process.
+METRICS_WORKERS = 1
+
+# Tickers whose prices are streamed from SQLite and processed together;
+# bounds peak memory to one block rather than the whole prices table.
+METRICS_BLOCK_TICKERS = 500
+
+# Read prices for metric computation from the memory-mapped dates x tickers
+# matrix cache (rebuilt whenever the prices table changes) instead of SQLite.
+PRICE_MATRIX_CACHE = False
+
+# Only recompute metrics for tickers whose prices changed since the last run
+# (tracked in the dirty_tickers table), carrying the rest forward.
+DIRTY_TICKERS_ONLY = True
+
 # ── Minimum History ──────────────────────────────────────────────────────────
 MIN_TRADING_DAYS = 200
 
@@ -59,6 +122,38 @@ RISK_PROFILES: dict[str, dict[str, float]] = {
     },
 }
 
+# ── Database ─────────────────────────────────────────────────────────────────
+# Reuse one read-only and one writer SQLite connection per thread instead of
+# opening and closing a connection on every query.
+DB_POOL_CONNECTIONS = True
+
+# Threads dedicated to the API's blocking SQLite/pandas work. Async
+# endpoints queue on this executor, bounding concurrent queries without
+# tying up Starlette's shared threadpool.
+DB_EXECUTOR_WORKERS = 4
+
+# Rows handed to each executemany call by db.upsert_rows. Rows are streamed
+# from iterators, so this bounds the parameters buffered per statement
+# rather than what is held in memory; transactions stay with the caller.
+WRITE_BATCH_ROWS = 10_000
+
+# PRAGMAs applied to every new connection. API readers favour read latency
+# (large page cache and memory map, query_only as a safety net); pipeline
+# writers trade per-commit fsyncs for bulk throughput, which WAL keeps safe
+# against corruption (only the last commits can be lost on power failure).
+SQLITE_READ_PRAGMAS: dict[str, int | str] = {
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,       # negative = KiB
+    "temp_store": "MEMORY",
+    "query_only": 1,
+}
+SQLITE_WRITE_PRAGMAS: dict[str, int | str] = {
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+    "synchronous": "NORMAL",
+}
+
 # ── Portfolio & API ──────────────────────────────────────────────────────────
 DEFAULT_TOP_N = 10
 API_HOST = "0.0.0.0"
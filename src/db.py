@@ -1,26 +1,120 @@
 """SQLite schema, connection helpers, and data access utilities."""
 
+import asyncio
+import atexit
+import functools
+import logging
+import os
 import sqlite3
-from contextlib import contextmanager
-from typing import Any
+import threading
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from itertools import islice
+from typing import Any, TypeVar
 
+import numpy as np
 import pandas as pd
 
-from src.config import DATA_DIR, DB_PATH
+from src.config import (
+    DATA_DIR,
+    DB_EXECUTOR_WORKERS,
+    DB_PATH,
+    DB_POOL_CONNECTIONS,
+    METRICS_BLOCK_TICKERS,
+    SQLITE_READ_PRAGMAS,
+    SQLITE_WRITE_PRAGMAS,
+    WRITE_BATCH_ROWS,
+)
 
-_SCHEMA_SQL = """
-CREATE TABLE IF NOT EXISTS prices (
-    ticker TEXT NOT NULL,
-    date TEXT NOT NULL,
+logger = logging.getLogger(__name__)
+
+# Bumped whenever _SCHEMA_SQL changes shape; existing databases are brought
+# up to date by init_db through the matching entry in _MIGRATIONS.
+SCHEMA_VERSION = 6
+
+# Tables are clustered on their natural keys (WITHOUT ROWID), so lookups by
+# key read the row straight from the primary-key b-tree, and the secondary
+# indexes cover the API's hot queries.
+#
+# Prices are stored compactly in price_bars, keyed by an integer ticker ID
+# from the tickers dictionary and the date as days since 1970-01-01. The
+# prices view (with INSTEAD OF triggers for inserts and deletes) maps them
+# back to (ticker, date) strings, so readers and ad-hoc writers see the
+# original layout; hot paths query price_bars directly.
+_PRICES_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS tickers (
+    id INTEGER PRIMARY KEY,
+    symbol TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS price_bars (
+    ticker_id INTEGER NOT NULL REFERENCES tickers(id),
+    day INTEGER NOT NULL,
     adj_close REAL NOT NULL,
     volume INTEGER,
-    UNIQUE(ticker, date)
+    PRIMARY KEY (ticker_id, day)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_price_bars_day ON price_bars(day);
+
+CREATE VIEW IF NOT EXISTS prices AS
+SELECT t.symbol AS ticker,
+       date(b.day * 86400, 'unixepoch') AS date,
+       b.adj_close,
+       b.volume
+FROM price_bars b
+JOIN tickers t ON t.id = b.ticker_id;
+
+CREATE TRIGGER IF NOT EXISTS prices_insert INSTEAD OF INSERT ON prices
+BEGIN
+    INSERT INTO tickers (symbol)
+        SELECT NEW.ticker
+        WHERE NOT EXISTS (SELECT 1 FROM tickers WHERE symbol = NEW.ticker);
+    INSERT INTO price_bars (ticker_id, day, adj_close, volume)
+    VALUES (
+        (SELECT id FROM tickers WHERE symbol = NEW.ticker),
+        CAST(strftime('%s', NEW.date) AS INTEGER) / 86400,
+        NEW.adj_close,
+        NEW.volume
+    );
+    INSERT OR IGNORE INTO dirty_tickers (ticker, stage)
+    VALUES (NEW.ticker, 'metrics');
+    INSERT INTO table_versions (table_name, version) VALUES ('prices', 1)
+    ON CONFLICT(table_name) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS prices_delete INSTEAD OF DELETE ON prices
+BEGIN
+    DELETE FROM price_bars
+    WHERE ticker_id = (SELECT id FROM tickers WHERE symbol = OLD.ticker)
+        AND day = CAST(strftime('%s', OLD.date) AS INTEGER) / 86400;
+    INSERT OR IGNORE INTO dirty_tickers (ticker, stage)
+    VALUES (OLD.ticker, 'metrics');
+    INSERT INTO table_versions (table_name, version) VALUES ('prices', 1)
+    ON CONFLICT(table_name) DO UPDATE SET version = version + 1;
+END;
+"""
+
+_SCHEMA_SQL = _PRICES_SCHEMA_SQL + """
+-- Each pipeline run writes its own copy of the metrics and scores it
+-- produces; readers only see the run named by published_run. Run 0 holds
+-- rows written before runs were tracked. metrics_config fingerprints the
+-- settings a run's metrics were computed with.
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    published_at TEXT,
+    metrics_config TEXT
 );
 
-CREATE INDEX IF NOT EXISTS idx_prices_ticker ON prices(ticker);
-CREATE INDEX IF NOT EXISTS idx_prices_date ON prices(date);
+CREATE TABLE IF NOT EXISTS published_run (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    run_id INTEGER NOT NULL REFERENCES runs(run_id)
+);
 
 CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL DEFAULT 0,
     ticker TEXT NOT NULL,
     as_of_date TEXT NOT NULL,
     window_months INTEGER NOT NULL,
@@ -31,72 +125,920 @@ CREATE TABLE IF NOT EXISTS metrics (
     max_drawdown REAL,
     momentum REAL,
     trading_days INTEGER,
-    UNIQUE(ticker, as_of_date, window_months)
-);
+    PRIMARY KEY (run_id, ticker, as_of_date, window_months)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_metrics_run_date_window
+    ON metrics(run_id, as_of_date, window_months);
+CREATE INDEX IF NOT EXISTS idx_metrics_date_run ON metrics(as_of_date, run_id);
 
-CREATE INDEX IF NOT EXISTS idx_metrics_ticker ON metrics(ticker);
-CREATE INDEX IF NOT EXISTS idx_metrics_date ON metrics(as_of_date);
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS dirty_tickers (
+    ticker TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    PRIMARY KEY (stage, ticker)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS metric_state (
+    ticker TEXT NOT NULL,
+    window_months INTEGER NOT NULL,
+    last_date TEXT NOT NULL,
+    last_close REAL NOT NULL,
+    bar_count INTEGER NOT NULL,
+    ret_sum REAL NOT NULL,
+    ret_sq_sum REAL NOT NULL,
+    down_sum REAL NOT NULL,
+    down_sq_sum REAL NOT NULL,
+    closes BLOB NOT NULL,
+    PRIMARY KEY (ticker, window_months)
+) WITHOUT ROWID;
 
 CREATE TABLE IF NOT EXISTS scores (
+    run_id INTEGER NOT NULL DEFAULT 0,
     ticker TEXT NOT NULL,
     as_of_date TEXT NOT NULL,
     risk_profile TEXT NOT NULL,
     raw_score REAL,
     normalized_score REAL,
     rank INTEGER,
-    UNIQUE(ticker, as_of_date, risk_profile)
-);
+    PRIMARY KEY (run_id, ticker, as_of_date, risk_profile)
+) WITHOUT ROWID;
+
+-- Covers get_top_stocks: filter by run + date + profile, read in rank order
+CREATE INDEX IF NOT EXISTS idx_scores_run_date_profile_rank
+    ON scores(
+        run_id, as_of_date, risk_profile, rank, normalized_score, raw_score
+    );
+CREATE INDEX IF NOT EXISTS idx_scores_date_run ON scores(as_of_date, run_id);
+
+-- Universe membership history: a ticker is a member from effective_from up
+-- to (excluding) effective_to, which stays NULL while it is current. Each
+-- resolution of the universe is logged in universe_refreshes.
+CREATE TABLE IF NOT EXISTS universe (
+    ticker TEXT NOT NULL,
+    effective_from TEXT NOT NULL,
+    effective_to TEXT,
+    PRIMARY KEY (ticker, effective_from)
+) WITHOUT ROWID;
 
-CREATE INDEX IF NOT EXISTS idx_scores_profile ON scores(risk_profile);
-CREATE INDEX IF NOT EXISTS idx_scores_date ON scores(as_of_date);
+CREATE TABLE IF NOT EXISTS universe_refreshes (
+    refresh_id INTEGER PRIMARY KEY,
+    refreshed_at TEXT NOT NULL,
+    source TEXT NOT NULL,
+    added INTEGER NOT NULL,
+    removed INTEGER NOT NULL
+);
 """
 
 
+# Per-thread pooled connections keyed by (pid, db path, readonly); the pid
+# keeps forked worker processes from reusing their parent's handles.
+_pool = threading.local()
+
+# Every pooled connection with its owning pid, so all of them are closed at
+# interpreter exit; closing the last one checkpoints and removes the -wal
+# file, which would otherwise outlive the process.
+_open_connections: list[tuple[int, bool, sqlite3.Connection]] = []
+_open_connections_lock = threading.Lock()
+
+
+def _connect(readonly: bool) -> sqlite3.Connection:
+    """Open a connection to ``DB_PATH`` with the reader or writer PRAGMAs."""
+    if readonly:
+        conn = sqlite3.connect(
+            f"{DB_PATH.as_uri()}?mode=ro", uri=True, check_same_thread=False
+        )
+        pragmas = SQLITE_READ_PRAGMAS
+    else:
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(DB_PATH), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        pragmas = SQLITE_WRITE_PRAGMAS
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+
+def _file_id() -> tuple[int, int] | None:
+    """Identify the file at ``DB_PATH`` by device and inode, if it exists."""
+    try:
+        stat = os.stat(DB_PATH)
+    except FileNotFoundError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+def _drop_pooled(key: tuple[int, str, bool]) -> None:
+    """Close and forget this thread's pooled connection for ``key``."""
+    conn = _pool.connections.pop(key)
+    _pool.files.pop(key, None)
+    with _open_connections_lock:
+        _open_connections[:] = [
+            entry for entry in _open_connections if entry[2] is not conn
+        ]
+    conn.close()
+
+
+def _pooled(readonly: bool) -> sqlite3.Connection:
+    """
+    Return this thread's pooled connection, opening it on first use.
+
+    A connection whose database file has since been deleted or replaced
+    (say by ``make clean`` and a fresh pipeline run) would keep serving
+    the old file, so it is reopened on the current one; the pooled writer
+    is only swapped between transactions.
+    """
+    connections = getattr(_pool, "connections", None)
+    if connections is None:
+        connections = _pool.connections = {}
+        _pool.files = {}
+    key = (os.getpid(), str(DB_PATH), readonly)
+    if key in connections and (
+        readonly or not getattr(_pool, "write_depth", 0)
+    ) and _pool.files.get(key) != _file_id():
+        logger.info("%s was replaced; reconnecting", DB_PATH)
+        _drop_pooled(key)
+    if key not in connections:
+        connections[key] = _connect(readonly)
+        _pool.files[key] = _file_id()
+        with _open_connections_lock:
+            _open_connections.append(
+                (key[0], readonly, connections[key])
+            )
+    return connections[key]
+
+
+def close_connections() -> None:
+    """Close every connection pooled by the calling thread."""
+    closing = list(getattr(_pool, "connections", {}).values())
+    with _open_connections_lock:
+        _open_connections[:] = [
+            entry for entry in _open_connections if entry[2] not in closing
+        ]
+    for conn in closing:
+        conn.close()
+    _pool.connections = {}
+    _pool.files = {}
+
+
+@atexit.register
+def _close_all_connections() -> None:
+    """
+    Close the connections this process pooled in any thread.
+
+    Readers close first: only a writer can checkpoint the WAL on close.
+    """
+    pid = os.getpid()
+    with _open_connections_lock:
+        for owner, readonly, conn in sorted(
+            _open_connections, key=lambda entry: not entry[1]
+        ):
+            if owner == pid:
+                conn.close()
+        _open_connections.clear()
+
+
 @contextmanager
-def get_connection():
-    """Yield a SQLite connection with WAL mode and foreign keys enabled."""
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.execute("PRAGMA journal_mode=WAL")
+def get_connection(readonly: bool = False):
+    """
+    Yield a SQLite connection in WAL mode.
+
+    Connections are reused per thread when ``DB_POOL_CONNECTIONS`` is set.
+    ``readonly`` connections cannot write; writer connections commit on
+    exit and roll back on error, with nested uses of the pooled writer
+    joining the outermost transaction.
+    """
+    if not DB_POOL_CONNECTIONS:
+        conn = _connect(readonly)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return
+
+    conn = _pooled(readonly)
+    if readonly:
+        yield conn
+        return
+
+    depth = getattr(_pool, "write_depth", 0)
+    _pool.write_depth = depth + 1
     try:
         yield conn
-        conn.commit()
+        if depth == 0:
+            conn.commit()
     except Exception:
-        conn.rollback()
+        if depth == 0:
+            conn.rollback()
         raise
     finally:
-        conn.close()
+        _pool.write_depth = depth
+
+
+_T = TypeVar("_T")
+
+# Dedicated threads for blocking database work issued from async code;
+# each keeps its own pooled connections for the life of the executor.
+_db_executor: ThreadPoolExecutor | None = None
+_db_executor_lock = threading.Lock()
+
+
+def _get_db_executor() -> ThreadPoolExecutor:
+    """Return the shared DB executor, starting it on first use."""
+    global _db_executor
+    with _db_executor_lock:
+        if _db_executor is None:
+            _db_executor = ThreadPoolExecutor(
+                max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db"
+            )
+        return _db_executor
+
+
+async def run_db(fn: Callable[..., _T], *args: Any, **kwargs: Any) -> _T:
+    """
+    Await blocking database work ``fn(*args, **kwargs)`` on the DB executor.
+
+    At most ``DB_EXECUTOR_WORKERS`` calls run at once; the rest wait in the
+    executor's queue without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_db_executor(), functools.partial(fn, *args, **kwargs)
+    )
+
+
+def shutdown_db_executor() -> None:
+    """Stop the DB executor; the next ``run_db`` call starts a new one."""
+    global _db_executor
+    with _db_executor_lock:
+        executor, _db_executor = _db_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def _rebuild_tables(
+    conn: sqlite3.Connection, tables: Sequence[str], indexes: Sequence[str],
+) -> list[str]:
+    """
+    Script the rebuild of ``tables`` in their current ``_SCHEMA_SQL`` shape.
+
+    The old tables are renamed aside (after dropping their ``indexes``),
+    the schema is recreated, and every column the old and new layouts
+    share is copied across; new columns take their defaults.
+    """
+    script = [f"DROP INDEX IF EXISTS {index};" for index in indexes]
+    script += [
+        f"ALTER TABLE {table} RENAME TO {table}_old;" for table in tables
+    ]
+    script.append(_SCHEMA_SQL)
+    for table in tables:
+        columns = ", ".join(
+            row[1] for row in conn.execute(f"PRAGMA table_info({table})")
+        )
+        script.append(
+            f"INSERT OR REPLACE INTO {table} ({columns}) "
+            f"SELECT {columns} FROM {table}_old;"
+        )
+        script.append(f"DROP TABLE {table}_old;")
+    return script
+
+
+def _migrate_v1(conn: sqlite3.Connection) -> str:
+    """Rebuild rowid tables as WITHOUT ROWID tables keyed on natural keys."""
+    existing = {
+        row[0] for row in
+        conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    }
+    tables = [
+        table for table in (
+            "prices", "metrics", "table_versions", "dirty_tickers",
+            "metric_state", "scores",
+        )
+        if table in existing
+    ]
+    return "\n".join(_rebuild_tables(conn, tables, [
+        "idx_prices_ticker", "idx_prices_date", "idx_metrics_ticker",
+        "idx_metrics_date", "idx_scores_profile", "idx_scores_date",
+    ]))
+
+
+def _migrate_v2(conn: sqlite3.Connection) -> str:
+    """
+    Move the prices table into the compact tickers + price_bars layout.
+
+    Databases upgraded from version 0 already went through the prices view
+    in ``_migrate_v1`` and need nothing further.
+    """
+    if not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'prices'"
+    ).fetchone():
+        return ""
+    return f"""
+        DROP INDEX IF EXISTS idx_prices_date;
+        ALTER TABLE prices RENAME TO prices_v1;
+        {_PRICES_SCHEMA_SQL}
+        INSERT INTO tickers (symbol)
+            SELECT DISTINCT ticker FROM prices_v1 ORDER BY ticker;
+        INSERT INTO price_bars (ticker_id, day, adj_close, volume)
+            SELECT t.id, CAST(strftime('%s', p.date) AS INTEGER) / 86400,
+                   p.adj_close, p.volume
+            FROM prices_v1 p
+            JOIN tickers t ON t.symbol = p.ticker;
+        DROP TABLE prices_v1;
+    """
+
+
+def _migrate_v3(conn: sqlite3.Connection) -> str:
+    """
+    Key metrics and scores by pipeline run.
+
+    Existing rows become run 0, which is published if it holds scores.
+    Databases upgraded from version 0 already have the run_id column.
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(metrics)")}
+    script = [_SCHEMA_SQL] if "run_id" in columns else _rebuild_tables(
+        conn,
+        ["metrics", "scores"],
+        ["idx_metrics_date_window", "idx_scores_date_profile_rank"],
+    )
+    script.append("""
+        INSERT OR IGNORE INTO runs (run_id, started_at, published_at)
+            SELECT 0, datetime('now'), datetime('now')
+            WHERE EXISTS (SELECT 1 FROM metrics);
+        INSERT OR IGNORE INTO published_run (id, run_id)
+            SELECT 1, 0 WHERE EXISTS (SELECT 1 FROM scores);
+    """)
+    return "\n".join(script)
+
+
+def _migrate_v4(conn: sqlite3.Connection) -> str:
+    """Add the universe membership tables; history starts empty."""
+    return _SCHEMA_SQL
+
+
+def _migrate_v5(conn: sqlite3.Connection) -> str:
+    """
+    Keep only scraped S&P 500 lists in the universe membership history.
+
+    Custom and fallback lists used to be recorded as members too; their
+    rows cannot be told apart from scraped ones, so a history that mixed
+    them is cleared and rebuilt from the next scrape.
+    """
+    mixed = conn.execute(
+        "SELECT 1 FROM universe_refreshes WHERE source != 'sp500' LIMIT 1"
+    ).fetchone()
+    return (
+        "DELETE FROM universe;\nDELETE FROM universe_refreshes;"
+        if mixed else ""
+    )
+
+
+def _migrate_v6(conn: sqlite3.Connection) -> str:
+    """
+    Fingerprint each run's metric settings and queue view writes as dirty.
+
+    Runs from before the fingerprint have none, so the next metrics run
+    recomputes every ticker. Databases upgraded from before version 3
+    created the runs table with the column already.
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(runs)")}
+    script = [
+        "DROP TRIGGER IF EXISTS prices_insert;",
+        "DROP TRIGGER IF EXISTS prices_delete;",
+    ]
+    if "metrics_config" not in columns:
+        script.append("ALTER TABLE runs ADD COLUMN metrics_config TEXT;")
+    script.append(_SCHEMA_SQL)
+    return "\n".join(script)
+
+
+# _MIGRATIONS[v] builds the script taking a database from user_version v
+# to v + 1.
+_MIGRATIONS: list[Callable[[sqlite3.Connection], str]] = [
+    _migrate_v1,
+    _migrate_v2,
+    _migrate_v3,
+    _migrate_v4,
+    _migrate_v5,
+    _migrate_v6,
+]
 
 
 def init_db() -> None:
-    """Create all tables and indexes if they don't exist."""
+    """
+    Create all tables and indexes, migrating an older schema if needed.
+
+    Each migration runs in its own transaction together with the
+    ``user_version`` bump, so an interrupted upgrade leaves the database
+    at the previous version rather than half-converted.
+    """
     with get_connection() as conn:
-        conn.executescript(_SCHEMA_SQL)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        fresh = not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'prices'"
+        ).fetchone()
+        if fresh:
+            version = SCHEMA_VERSION
+
+        for target, migration in enumerate(
+            _MIGRATIONS[version:], start=version + 1,
+        ):
+            logger.info("Migrating %s to schema version %d", DB_PATH, target)
+            conn.executescript(
+                f"BEGIN;\n{migration(conn)}\n"
+                f"PRAGMA user_version = {target};\nCOMMIT;"
+            )
+        if version < SCHEMA_VERSION:
+            conn.execute("VACUUM")  # reclaim the pages of rebuilt tables
+
+        conn.executescript(
+            f"{_SCHEMA_SQL}\nPRAGMA user_version = {SCHEMA_VERSION};"
+        )
 
 
 def load_dataframe(query: str, params: tuple[Any, ...] = ()) -> pd.DataFrame:
     """Run a SELECT and return results as a DataFrame."""
-    with get_connection() as conn:
+    with get_connection(readonly=True) as conn:
         return pd.read_sql_query(query, conn, params=params)
 
 
+def days_to_dates(days: pd.Series) -> pd.Series:
+    """Format day numbers (days since 1970-01-01) as YYYY-MM-DD strings."""
+    unique, inverse = np.unique(
+        days.to_numpy(dtype=np.int64), return_inverse=True
+    )
+    labels = pd.to_datetime(unique, unit="D").strftime("%Y-%m-%d").to_numpy()
+    return pd.Series(labels[inverse], index=days.index)
+
+
+def get_price_tickers() -> list[str]:
+    """Return the sorted symbols that have at least one price bar."""
+    rows = execute_query(
+        """
+        SELECT symbol FROM tickers t
+        WHERE EXISTS (SELECT 1 FROM price_bars b WHERE b.ticker_id = t.id)
+        ORDER BY symbol
+        """,
+        readonly=True,
+    )
+    return [row[0] for row in rows]
+
+
+def iter_price_blocks(
+    block_size: int = METRICS_BLOCK_TICKERS,
+    tickers: Sequence[str] | None = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream prices one block of tickers at a time.
+
+    Yields long-format DataFrames (ticker, date, adj_close) ordered by
+    ticker and date, each holding at most ``block_size`` complete tickers,
+    so callers never materialize the whole prices table. Streams every
+    ticker unless ``tickers`` is given.
+    """
+    tickers = get_price_tickers() if tickers is None else sorted(tickers)
+    with get_connection(readonly=True) as conn:
+        for start in range(0, len(tickers), block_size):
+            block = tickers[start:start + block_size]
+            placeholders = ", ".join("?" * len(block))
+            prices = pd.read_sql_query(
+                f"""
+                SELECT t.symbol AS ticker, b.day, b.adj_close
+                FROM tickers t
+                JOIN price_bars b ON b.ticker_id = t.id
+                WHERE t.symbol IN ({placeholders})
+                ORDER BY t.symbol, b.day
+                """,  # noqa: S608
+                conn,
+                params=tuple(block),
+            )
+            prices.insert(1, "date", days_to_dates(prices.pop("day")))
+            yield prices
+
+
+def frame_rows(df: pd.DataFrame, columns: Sequence[str]) -> Iterator[tuple]:
+    """
+    Stream ``df[columns]`` as row tuples for ``upsert_rows``.
+
+    Each column is converted to native Python values once (numpy integers
+    would bind as BLOBs) and zipped lazily, so no list of row tuples is
+    built. NaN binds as NULL.
+    """
+    return zip(*(df[col].tolist() for col in columns))
+
+
+@contextmanager
+def deferred_indexes(conn: sqlite3.Connection, table: str) -> Iterator[None]:
+    """
+    Drop ``table``'s secondary indexes for the block and rebuild them after.
+
+    For full reloads, building each index once over the loaded rows is
+    cheaper than maintaining it row by row. DDL does not open a transaction
+    implicitly, so one is begun here if the caller has none: the drop and
+    rebuild then commit with the loaded rows, readers never see the table
+    without its indexes, and rolling back after an error (as
+    ``get_connection`` does) restores them.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    indexes = [
+        (name, sql) for name, sql in conn.execute(
+            """
+            SELECT name, sql FROM sqlite_master
+            WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL
+            """,
+            (table,),
+        )
+    ]
+    for name, _ in indexes:
+        conn.execute(f"DROP INDEX {name}")
+    yield
+    for _, sql in indexes:
+        conn.execute(sql)
+
+
+def upsert_rows(
+    conn: sqlite3.Connection,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    key: Sequence[str] = (),
+    batch_size: int = WRITE_BATCH_ROWS,
+    rebuild_indexes: bool = False,
+) -> int:
+    """
+    Write ``rows`` into ``table`` with ``INSERT ... ON CONFLICT DO UPDATE``.
+
+    Rows whose ``key`` already exists have their other columns updated in
+    place, unlike ``INSERT OR REPLACE``, which deletes and reinserts them
+    (touching every index twice). Without a ``key`` the rows are plainly
+    inserted. ``rows`` is consumed lazily, ``batch_size`` rows per
+    ``executemany``, inside the caller's transaction; ``rebuild_indexes``
+    defers the table's secondary indexes (see ``deferred_indexes``).
+    Returns the number of rows written.
+    """
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' * len(columns))})"
+    )
+    if key:
+        updates = ", ".join(
+            f"{col} = excluded.{col}" for col in columns if col not in key
+        )
+        sql += f" ON CONFLICT ({', '.join(key)}) DO " + (
+            f"UPDATE SET {updates}" if updates else "NOTHING"
+        )
+
+    written = 0
+    rows = iter(rows)
+    indexes = (
+        deferred_indexes(conn, table) if rebuild_indexes else nullcontext()
+    )
+    with indexes:
+        while batch := list(islice(rows, batch_size)):
+            conn.executemany(sql, batch)
+            written += len(batch)
+    return written
+
+
 def save_dataframe(df: pd.DataFrame, table: str) -> int:
-    """Insert-or-replace a DataFrame into the given table. Returns row count."""
+    """
+    Upsert a DataFrame into the given table. Returns row count.
+
+    Prices written to ``price_bars`` queue their tickers for the metrics
+    stage, as writes through the ``prices`` view do by its triggers.
+    """
     with get_connection() as conn:
-        return df.to_sql(table, conn, if_exists="append", index=False,
-                         method="multi")
+        key = [
+            row[1] for row in sorted(
+                conn.execute(f"PRAGMA table_info({table})"),
+                key=lambda row: row[5],
+            )
+            if row[5]
+        ]
+        written = upsert_rows(
+            conn, table, list(df.columns), frame_rows(df, df.columns), key,
+        )
+        if table == "price_bars" and written:
+            symbols = dict(conn.execute("SELECT id, symbol FROM tickers"))
+            mark_dirty(
+                conn,
+                (symbols[ticker_id] for ticker_id in df["ticker_id"].unique()),
+                "metrics",
+            )
+            bump_table_version(conn, "prices")
+        return written
 
 
-def execute_query(query: str, params: tuple[Any, ...] = ()) -> list[Any]:
+def execute_query(
+    query: str, params: tuple[Any, ...] = (), readonly: bool = False,
+) -> list[Any]:
     """Execute arbitrary SQL and return fetchall() results."""
-    with get_connection() as conn:
+    with get_connection(readonly=readonly) as conn:
         cur = conn.execute(query, params)
         return cur.fetchall()
 
 
-def get_latest_date(table: str, date_col: str = "date") -> str | None:
-    """Return the most recent date string in the given table, or None."""
+def get_latest_date(
+    table: str, date_col: str = "date", run_id: int | None = None,
+) -> str | None:
+    """
+    Return the most recent date string in the given table, or None.
+
+    ``run_id`` restricts the lookup to the rows of one pipeline run.
+    """
+    where, params = "", ()
+    if run_id is not None:
+        where, params = "WHERE run_id = ?", (run_id,)
     rows = execute_query(
-        f"SELECT MAX({date_col}) FROM {table}"  # noqa: S608
+        f"SELECT MAX({date_col}) FROM {table} {where}",  # noqa: S608
+        params,
+        readonly=True,
     )
     return rows[0][0] if rows and rows[0][0] else None
+
+
+def get_latest_price_date() -> str | None:
+    """Return the most recent price date, read from the day index."""
+    rows = execute_query(
+        "SELECT date(MAX(day) * 86400, 'unixepoch') FROM price_bars",
+        readonly=True,
+    )
+    return rows[0][0] if rows else None
+
+
+def get_latest_price_dates() -> dict[str, str]:
+    """Return each stored ticker's most recent price date."""
+    rows = execute_query(
+        """
+        SELECT t.symbol, date(MAX(b.day) * 86400, 'unixepoch')
+        FROM price_bars b
+        JOIN tickers t ON t.id = b.ticker_id
+        GROUP BY b.ticker_id
+        """,
+        readonly=True,
+    )
+    return dict(rows)
+
+
+def get_earliest_price_dates() -> dict[str, str]:
+    """Return each stored ticker's earliest price date."""
+    rows = execute_query(
+        """
+        SELECT t.symbol, date(MIN(b.day) * 86400, 'unixepoch')
+        FROM price_bars b
+        JOIN tickers t ON t.id = b.ticker_id
+        GROUP BY b.ticker_id
+        """,
+        readonly=True,
+    )
+    return dict(rows)
+
+
+def begin_run(
+    conn: sqlite3.Connection, metrics_config: str | None = None,
+) -> int:
+    """
+    Open a new pipeline run and return its ID; publish it when complete.
+
+    ``metrics_config`` fingerprints the settings its metrics are computed
+    with (see ``get_run_metrics_config``).
+    """
+    return conn.execute(
+        """
+        INSERT INTO runs (started_at, metrics_config)
+        VALUES (datetime('now'), ?)
+        """,
+        (metrics_config,),
+    ).lastrowid
+
+
+def get_run_metrics_config(run_id: int) -> str | None:
+    """Return the metric settings fingerprint recorded for ``run_id``."""
+    rows = execute_query(
+        "SELECT metrics_config FROM runs WHERE run_id = ?",
+        (run_id,),
+        readonly=True,
+    )
+    return rows[0][0] if rows else None
+
+
+def get_latest_run(table: str) -> int | None:
+    """Return the newest run with rows in ``table``, published or not."""
+    rows = execute_query(
+        f"SELECT MAX(run_id) FROM {table}",  # noqa: S608
+        readonly=True,
+    )
+    return rows[0][0] if rows else None
+
+
+def get_published_run() -> int | None:
+    """Return the run readers should see, or None before the first publish."""
+    rows = execute_query("SELECT run_id FROM published_run", readonly=True)
+    return rows[0][0] if rows else None
+
+
+def publish_run(conn: sqlite3.Connection, run_id: int) -> None:
+    """
+    Atomically point readers at ``run_id``; call inside the write transaction.
+
+    Rows superseded by a newer published version are pruned, except those
+    of the run being replaced, which readers may still be querying.
+
+    Only published runs supersede rows: a run that was never published
+    (say, metrics that were never scored) leaves older rows, whose scores
+    readers still join, in place. Only those newer than the run published
+    before the one being replaced can have superseded anything not yet
+    pruned, so older rows are checked against each of them in turn, by a
+    lookup on the full key. Rows of the replaced run are pruned at the
+    next publish.
+    """
+    previous = conn.execute("SELECT run_id FROM published_run").fetchone()
+    conn.execute(
+        """
+        INSERT INTO published_run (id, run_id) VALUES (1, ?)
+        ON CONFLICT(id) DO UPDATE SET run_id = excluded.run_id
+        """,
+        (run_id,),
+    )
+    conn.execute(
+        "UPDATE runs SET published_at = datetime('now') WHERE run_id = ?",
+        (run_id,),
+    )
+    if previous is None:
+        return
+
+    before = conn.execute(
+        """
+        SELECT MAX(run_id) FROM runs
+        WHERE run_id < ? AND published_at IS NOT NULL
+        """,
+        (previous[0],),
+    ).fetchone()[0]
+    newer_runs = [
+        row[0] for row in conn.execute(
+            """
+            SELECT run_id FROM runs
+            WHERE run_id > ? AND run_id <= ? AND published_at IS NOT NULL
+            """,
+            (-1 if before is None else before, run_id),
+        )
+    ]
+    for table, key in (
+        ("metrics", ("ticker", "as_of_date", "window_months")),
+        ("scores", ("ticker", "as_of_date", "risk_profile")),
+    ):
+        same_key = " AND ".join(f"newer.{col} = {table}.{col}" for col in key)
+        for newer in newer_runs:
+            conn.execute(
+                f"""
+                DELETE FROM {table}
+                WHERE run_id < ?
+                    AND EXISTS (
+                        SELECT 1 FROM {table} newer
+                        WHERE newer.run_id = ? AND {same_key}
+                    )
+                """,  # noqa: S608
+                (min(newer, previous[0]), newer),
+            )
+
+
+def bump_table_version(conn: sqlite3.Connection, table: str) -> None:
+    """Record that ``table`` changed; call inside the writing transaction."""
+    conn.execute(
+        """
+        INSERT INTO table_versions (table_name, version) VALUES (?, 1)
+        ON CONFLICT(table_name) DO UPDATE SET version = version + 1
+        """,
+        (table,),
+    )
+
+
+def get_table_version(table: str) -> int:
+    """Return the change counter for ``table`` (0 if never bumped)."""
+    rows = execute_query(
+        "SELECT version FROM table_versions WHERE table_name = ?", (table,),
+        readonly=True,
+    )
+    return rows[0][0] if rows else 0
+
+
+def get_universe(as_of: str | None = None) -> list[str]:
+    """Return the universe members on ``as_of`` (default: current members)."""
+    if as_of is None:
+        where, params = "effective_to IS NULL", ()
+    else:
+        where = (
+            "effective_from <= ? "
+            "AND (effective_to IS NULL OR effective_to > ?)"
+        )
+        params = (as_of, as_of)
+    rows = execute_query(
+        f"SELECT DISTINCT ticker FROM universe WHERE {where} ORDER BY ticker",
+        params,
+        readonly=True,
+    )
+    return [row[0] for row in rows]
+
+
+def get_universe_age_hours(source: str) -> float | None:
+    """Hours since the universe was last resolved from ``source``, if ever."""
+    rows = execute_query(
+        """
+        SELECT (julianday('now') - julianday(MAX(refreshed_at))) * 24
+        FROM universe_refreshes
+        WHERE source = ?
+        """,
+        (source,),
+        readonly=True,
+    )
+    return rows[0][0] if rows else None
+
+
+def update_universe(
+    conn: sqlite3.Connection, tickers: Iterable[str], source: str,
+) -> tuple[list[str], list[str]]:
+    """
+    Record ``tickers`` as today's universe; call inside the write transaction.
+
+    Departed members are closed off and new ones opened as of today.
+    Returns (added, removed).
+    """
+    tickers = set(tickers)
+    current = {
+        row[0] for row in
+        conn.execute("SELECT ticker FROM universe WHERE effective_to IS NULL")
+    }
+    added = sorted(tickers - current)
+    removed = sorted(current - tickers)
+    conn.executemany(
+        """
+        UPDATE universe SET effective_to = date('now')
+        WHERE ticker = ? AND effective_to IS NULL
+        """,
+        ((ticker,) for ticker in removed),
+    )
+    # A ticker removed and re-added on the same day reopens its row
+    conn.executemany(
+        """
+        INSERT INTO universe (ticker, effective_from) VALUES (?, date('now'))
+        ON CONFLICT(ticker, effective_from) DO UPDATE SET effective_to = NULL
+        """,
+        ((ticker,) for ticker in added),
+    )
+    conn.execute(
+        """
+        INSERT INTO universe_refreshes (refreshed_at, source, added, removed)
+        VALUES (datetime('now'), ?, ?, ?)
+        """,
+        (source, len(added), len(removed)),
+    )
+    return added, removed
+
+
+def mark_dirty(
+    conn: sqlite3.Connection, tickers: Iterable[str], stage: str,
+) -> None:
+    """Queue ``tickers`` for reprocessing by a pipeline ``stage``."""
+    conn.executemany(
+        "INSERT OR IGNORE INTO dirty_tickers (ticker, stage) VALUES (?, ?)",
+        ((ticker, stage) for ticker in tickers),
+    )
+
+
+def get_dirty_tickers(stage: str) -> list[str]:
+    """Return the tickers queued for a pipeline ``stage``."""
+    rows = execute_query(
+        "SELECT ticker FROM dirty_tickers WHERE stage = ? ORDER BY ticker",
+        (stage,),
+        readonly=True,
+    )
+    return [row[0] for row in rows]
+
+
+def clear_dirty(
+    conn: sqlite3.Connection,
+    stage: str,
+    tickers: Iterable[str] | None = None,
+) -> None:
+    """
+    Dequeue ``tickers`` (default: all) once a ``stage`` has processed them.
+
+    Pass the tickers read by ``get_dirty_tickers`` when others may have
+    been queued since, so those stay queued for the next run.
+    """
+    if tickers is None:
+        conn.execute("DELETE FROM dirty_tickers WHERE stage = ?", (stage,))
+        return
+    conn.executemany(
+        "DELETE FROM dirty_tickers WHERE ticker = ? AND stage = ?",
+        ((ticker, stage) for ticker in tickers),
+    )
@@ -0,0 +1,164 @@
+"""On-disk cache of raw per-ticker price downloads under DATA_DIR."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pandas as pd
+
+from src.config import (
+    PRICE_CACHE_DIR,
+    PRICE_CACHE_MAX_MB,
+    PRICE_CACHE_TTL_HOURS,
+    PRICE_INTERVAL,
+)
+
+if TYPE_CHECKING:
+    from src.pull_prices import PriceFetcher
+
+logger = logging.getLogger(__name__)
+
+# Serializes eviction across the download pool's threads
+_evict_lock = threading.Lock()
+
+
+def _entry_path(ticker: str, start: str, end: str) -> Path:
+    """Content-addressed location of one ticker's download for a range."""
+    key = hashlib.sha256(
+        f"{ticker}|{start}|{end}|{PRICE_INTERVAL}".encode()
+    ).hexdigest()
+    return PRICE_CACHE_DIR / key[:2] / f"{key}.pkl"
+
+
+def _read(path: Path) -> pd.DataFrame | None:
+    """
+    Return a cached frame, or None if missing or older than the TTL.
+
+    An entry that cannot be unpickled (truncated, or written by another
+    pandas version) is a miss too, and is removed so the download
+    replaces it.
+    """
+    try:
+        if time.time() - path.stat().st_mtime > PRICE_CACHE_TTL_HOURS * 3600:
+            return None
+        return pd.read_pickle(path)
+    except FileNotFoundError:
+        return None
+    except Exception as exc:
+        logger.warning("Dropping unreadable cache entry %s: %s", path, exc)
+        path.unlink(missing_ok=True)
+        return None
+
+
+def _write(path: Path, frame: pd.DataFrame) -> None:
+    """Store ``frame`` atomically so readers never see a partial entry."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, staging = tempfile.mkstemp(dir=path.parent, prefix=".write-")
+    os.close(fd)
+    try:
+        frame.to_pickle(staging)
+        os.replace(staging, path)
+    finally:
+        Path(staging).unlink(missing_ok=True)
+
+
+def _split(raw: pd.DataFrame, tickers: list[str]) -> dict[str, pd.DataFrame]:
+    """Split a wide download into one (date x field) frame per ticker."""
+    if raw.empty:
+        return {ticker: pd.DataFrame() for ticker in tickers}
+    if not isinstance(raw.columns, pd.MultiIndex):
+        # Single ticker without a ticker level
+        return {tickers[0]: raw}
+    present = set(raw.columns.get_level_values(1))
+    return {
+        ticker: (
+            raw.xs(ticker, axis=1, level=1).dropna(how="all")
+            if ticker in present else pd.DataFrame()
+        )
+        for ticker in tickers
+    }
+
+
+def evict() -> None:
+    """
+    Drop expired entries, then the oldest until under the size cap.
+
+    Entries age from when they were downloaded, so a busy cache turns over
+    in download order rather than growing past ``PRICE_CACHE_MAX_MB``.
+    """
+    with _evict_lock:
+        now = time.time()
+        entries = []
+        for path in PRICE_CACHE_DIR.glob("*/*.pkl"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if now - stat.st_mtime > PRICE_CACHE_TTL_HOURS * 3600:
+                path.unlink(missing_ok=True)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        limit = PRICE_CACHE_MAX_MB * 1024 * 1024
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= limit:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def cached_fetcher(fetch: PriceFetcher) -> PriceFetcher:
+    """
+    Wrap ``fetch`` so each ticker's download is served from disk if fresh.
+
+    Entries are keyed by ticker, requested date range and interval, so a
+    response for one range never answers a request for another, and expire
+    after ``PRICE_CACHE_TTL_HOURS``. Only the tickers missing from the
+    cache are passed to ``fetch``; their results are stored before being
+    returned. Empty results are not stored: yf.download returns a
+    throttled or failed ticker empty, and caching that would hide it from
+    the download's retries and from reruns until the entry expired.
+    """
+
+    def fetch_cached(tickers: list[str], start: str, end: str) -> pd.DataFrame:
+        frames: dict[str, pd.DataFrame] = {}
+        missing = []
+        for ticker in tickers:
+            frame = _read(_entry_path(ticker, start, end))
+            if frame is None:
+                missing.append(ticker)
+            else:
+                frames[ticker] = frame
+
+        if missing:
+            for ticker, frame in _split(
+                fetch(missing, start, end), missing
+            ).items():
+                if not frame.empty:
+                    _write(_entry_path(ticker, start, end), frame)
+                frames[ticker] = frame
+            evict()
+        logger.debug(
+            "Price cache: %d hits, %d misses",
+            len(tickers) - len(missing),
+            len(missing),
+        )
+
+        frames = {
+            ticker: frame for ticker, frame in frames.items()
+            if not frame.empty
+        }
+        if not frames:
+            return pd.DataFrame()
+        # Back to yf.download's (field, ticker) column layout
+        return pd.concat(frames, axis=1).swaplevel(axis=1).sort_index(axis=1)
+
+    return fetch_cached
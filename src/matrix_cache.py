@@ -0,0 +1,131 @@
+"""Memory-mapped dates x tickers price matrices cached under DATA_DIR."""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from src.config import MATRIX_CACHE_DIR
+from src.db import (
+    execute_query,
+    get_price_tickers,
+    get_table_version,
+    iter_price_blocks,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PriceMatrix(NamedTuple):
+    """
+    Dense view of the prices table.
+
+    ``close[i, j]`` is the adjusted close of ``tickers[j]`` on ``dates[i]``,
+    NaN where the ticker has no bar. The matrix is a read-only memory map
+    shared by every process that loads the same cache version.
+    """
+
+    dates: np.ndarray
+    tickers: np.ndarray
+    close: np.ndarray
+
+
+def _cache_key() -> str | None:
+    """
+    Identify the current contents of the prices table.
+
+    Combines the writer-maintained version counter with the row count and
+    latest date, so writes that bypass the counter still invalidate the
+    cache. Returns None when the table is empty.
+    """
+    rows, latest = execute_query(
+        "SELECT COUNT(*), date(MAX(day) * 86400, 'unixepoch') FROM price_bars",
+        readonly=True,
+    )[0]
+    if not rows:
+        return None
+    return f"v{get_table_version('prices')}-{rows}-{latest}"
+
+
+def _build(path: Path) -> None:
+    """Write the matrix for the current prices table into ``path``."""
+    dates = pd.Index([
+        row[0] for row in
+        execute_query(
+            """
+            SELECT DISTINCT date(day * 86400, 'unixepoch') FROM price_bars
+            ORDER BY day
+            """,
+            readonly=True,
+        )
+    ])
+    tickers = pd.Index(get_price_tickers())
+    shape = (len(dates), len(tickers))
+
+    MATRIX_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(dir=MATRIX_CACHE_DIR, prefix=".build-"))
+    try:
+        close = np.lib.format.open_memmap(
+            staging / "close.npy", mode="w+", dtype=np.float64, shape=shape
+        )
+
+        # Blocks arrive in ticker order, so each fills a contiguous column range
+        for block in iter_price_blocks():
+            cols = tickers.get_indexer(block["ticker"])
+            lo, hi = cols.min(), cols.max() + 1
+            block_close = np.full((len(dates), hi - lo), np.nan)
+            block_close[dates.get_indexer(block["date"]), cols - lo] = (
+                block["adj_close"].to_numpy(dtype=float)
+            )
+            close[:, lo:hi] = block_close
+
+        close.flush()
+        del close
+        np.save(staging / "dates.npy", dates.to_numpy(dtype=str))
+        np.save(staging / "tickers.npy", tickers.to_numpy(dtype=str))
+
+        # Publish atomically; a concurrent builder may have won the race
+        try:
+            os.replace(staging, path)
+        except OSError:
+            if not path.exists():
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def _prune(keep: Path) -> None:
+    """Remove cached versions other than ``keep``."""
+    for entry in MATRIX_CACHE_DIR.iterdir():
+        if entry != keep and not entry.name.startswith("."):
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def load_price_matrix() -> PriceMatrix | None:
+    """
+    Map the cached price matrix, rebuilding it if the prices table changed.
+
+    Returns None when there is no price data.
+    """
+    key = _cache_key()
+    if key is None:
+        return None
+
+    path = MATRIX_CACHE_DIR / key
+    if not path.exists():
+        logger.info("Building price matrix cache %s", key)
+        _build(path)
+        _prune(path)
+
+    return PriceMatrix(
+        dates=np.load(path / "dates.npy"),
+        tickers=np.load(path / "tickers.npy"),
+        close=np.load(path / "close.npy", mmap_mode="r"),
+    )
@@ -0,0 +1,95 @@
+"""Run every pipeline stage in one process, handing results over in memory.
+
+Unlike running ``src.pull_prices``, ``src.compute_metrics`` and
+``src.score_stocks`` one after another, the interpreter starts once and
+each stage's output is persisted once and passed straight to the next
+stage rather than read back from SQLite.
+
+Run with ``python -m src.pipeline [--skip-prices] [--no-persist] [--full]``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+
+import pandas as pd
+
+from src.compute_metrics import refresh_metrics
+from src.pull_prices import PriceFetcher, refresh_prices
+from src.score_stocks import refresh_scores
+
+logger = logging.getLogger(__name__)
+
+
+def run_pipeline(
+    fetch: PriceFetcher | None = None,
+    pull: bool = True,
+    persist: bool = True,
+    full: bool = False,
+) -> pd.DataFrame:
+    """
+    Refresh prices, then compute metrics and scores from them in memory.
+
+    Prices are always stored, since they are the history every later run
+    computes from (``pull=False`` scores the prices already stored).
+    Without ``persist`` the metrics and scores are computed but not
+    written: the published run, which the API joins with its metrics, is
+    left as it was, and changed tickers stay queued for the next run.
+    ``full`` recomputes the metrics of every ticker (see
+    ``refresh_metrics``) rather than only those whose prices changed.
+    Returns the scores computed (empty if nothing changed).
+    """
+    timings = {}
+    start = time.perf_counter()
+    if pull:
+        refresh_prices(fetch)
+        timings["prices"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    run = refresh_metrics(persist=persist, full=full)
+    timings["metrics"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if run is not None:
+        scores = refresh_scores(run=run)
+    elif persist:
+        # Nothing recomputed, but an earlier run may still await scoring
+        scores = refresh_scores()
+    else:
+        scores = pd.DataFrame()
+    timings["scores"] = time.perf_counter() - start
+
+    logger.info(
+        "Pipeline complete (%s)",
+        ", ".join(f"{stage} {secs:.1f}s" for stage, secs in timings.items()),
+    )
+    return scores
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    parser = argparse.ArgumentParser(
+        prog="python -m src.pipeline",
+        description="Refresh prices, metrics and scores in one process.",
+    )
+    parser.add_argument(
+        "--skip-prices", action="store_true",
+        help="score the stored prices without downloading",
+    )
+    parser.add_argument(
+        "--no-persist", action="store_true",
+        help="compute metrics and scores without writing or publishing them",
+    )
+    parser.add_argument(
+        "--full", action="store_true",
+        help="recompute metrics for every ticker, not just changed ones",
+    )
+    args = parser.parse_args()
+    run_pipeline(
+        pull=not args.skip_prices, persist=not args.no_persist, full=args.full,
+    )
@@ -2,10 +2,20 @@
 
 from __future__ import annotations
 
+import threading
+from typing import Any
+
+import numpy as np
 import pandas as pd
 
-from src.config import DEFAULT_TOP_N
-from src.db import load_dataframe
+from src.config import DEFAULT_TOP_N, SCORING_WINDOW_MONTHS
+from src.db import get_latest_date, get_published_run, load_dataframe
+from src.score_stocks import factor_matrix, weight_matrix
+
+# Latest scoring-window metrics held in memory for ad-hoc weight scoring,
+# reloaded whenever a new pipeline run is published.
+_metrics_cache: dict[str, Any] = {}
+_metrics_cache_lock = threading.Lock()
 
 
 def get_top_stocks(
@@ -16,19 +26,19 @@ def get_top_stocks(
     """
     Return the top-N ranked stocks for a given risk profile.
 
-    Joins scores with metrics to return a rich result set.
+    Joins scores with metrics to return a rich result set, read from the
+    published run that last scored ``as_of_date`` (default: the latest
+    published date).
     """
-    date_clause = (
-        "s.as_of_date = ?"
-        if as_of_date
-        else "s.as_of_date = (SELECT MAX(as_of_date) FROM scores)"
-    )
-    params: tuple = (risk_profile, top_n)
-    if as_of_date:
-        params = (as_of_date, risk_profile, top_n)
+    published = get_published_run()
+    if published is None:
+        return pd.DataFrame()
+    if not as_of_date:
+        as_of_date = get_latest_date("scores", "as_of_date", run_id=published)
 
-    query = f"""
+    query = """
         SELECT
+            s.as_of_date,
             s.rank,
             s.ticker,
             s.normalized_score,
@@ -41,40 +51,59 @@ def get_top_stocks(
             m.trading_days
         FROM scores s
         JOIN metrics m
-            ON s.ticker = m.ticker
-            AND s.as_of_date = m.as_of_date
-        WHERE {date_clause}
+            ON m.run_id = s.run_id
+            AND m.ticker = s.ticker
+            AND m.as_of_date = s.as_of_date
+            AND m.window_months = ?
+        WHERE s.run_id = (
+                SELECT MAX(run_id) FROM scores
+                WHERE as_of_date = ? AND run_id <= ?
+            )
+            AND s.as_of_date = ?
             AND s.risk_profile = ?
         ORDER BY s.rank ASC
         LIMIT ?
     """
 
-    return load_dataframe(query, params)
+    return load_dataframe(
+        query,
+        (SCORING_WINDOW_MONTHS, as_of_date, published, as_of_date,
+         risk_profile, top_n),
+    )
 
 
 def get_stock_detail(ticker: str) -> dict:
     """
     Return detailed metrics and scores across all risk profiles for a
     single ticker.
+
+    Metrics are listed for every window, longest first. Both come from
+    the latest date of the published run.
     """
+    published = get_published_run()
     metrics = load_dataframe(
         """
         SELECT * FROM metrics
-        WHERE ticker = ?
-            AND as_of_date = (SELECT MAX(as_of_date) FROM metrics)
+        WHERE run_id = ? AND ticker = ?
+            AND as_of_date = (
+                SELECT MAX(as_of_date) FROM metrics WHERE run_id = ?
+            )
+        ORDER BY window_months DESC
         """,
-        (ticker,),
-    )
+        (published, ticker, published),
+    ).drop(columns="run_id")
 
     scores = load_dataframe(
         """
         SELECT risk_profile, raw_score, normalized_score, rank
         FROM scores
-        WHERE ticker = ?
-            AND as_of_date = (SELECT MAX(as_of_date) FROM scores)
+        WHERE run_id = ? AND ticker = ?
+            AND as_of_date = (
+                SELECT MAX(as_of_date) FROM scores WHERE run_id = ?
+            )
         ORDER BY risk_profile
         """,
-        (ticker,),
+        (published, ticker, published),
     )
 
     return {
@@ -82,3 +111,63 @@ def get_stock_detail(ticker: str) -> dict:
         "metrics": metrics.to_dict(orient="records"),
         "scores": scores.to_dict(orient="records"),
     }
+
+
+def _latest_metrics_arrays() -> dict[str, Any]:
+    """Return the cached latest metrics, reloading them on a new publish."""
+    key = get_published_run()
+    with _metrics_cache_lock:
+        if "metrics" not in _metrics_cache or _metrics_cache["key"] != key:
+            metrics = load_dataframe(
+                """
+                SELECT ticker, as_of_date, annualized_return, volatility,
+                       max_drawdown, downside_deviation, momentum,
+                       trading_days
+                FROM metrics
+                WHERE run_id = ? AND window_months = ?
+                    AND as_of_date = (
+                        SELECT MAX(as_of_date) FROM metrics WHERE run_id = ?
+                    )
+                """,
+                (key, SCORING_WINDOW_MONTHS, key),
+            )
+            _metrics_cache.update(
+                key=key,
+                metrics=metrics,
+                factors=factor_matrix(metrics),
+            )
+        return dict(_metrics_cache)
+
+
+def get_custom_top_stocks(
+    weights: dict[str, float],
+    top_n: int = DEFAULT_TOP_N,
+) -> tuple[str | None, pd.DataFrame]:
+    """
+    Rank the latest metrics under ad-hoc ``weights`` without touching the DB.
+
+    ``weights`` holds alpha, beta, gamma and delta as in ``RISK_PROFILES``.
+    Scoring runs against NumPy arrays cached in memory, so only a
+    published-run check hits SQLite per call.
+
+    Returns (as_of_date, top-N DataFrame shaped like ``get_top_stocks``).
+    """
+    cached = _latest_metrics_arrays()
+    metrics = cached["metrics"]
+    if metrics.empty:
+        return None, pd.DataFrame()
+
+    raw = cached["factors"] @ weight_matrix({"custom": weights})[:, 0]
+    raw_score = pd.Series(raw, index=metrics.index).dropna()
+    ranked = metrics.loc[raw_score.index].assign(
+        raw_score=raw_score,
+        normalized_score=raw_score.rank(pct=True),
+        rank=raw_score.rank(ascending=False, method="min").astype(int),
+    )
+    top = ranked.iloc[np.argsort(-raw_score.to_numpy(), kind="stable")[:top_n]]
+
+    return metrics["as_of_date"].iloc[0], top[
+        ["rank", "ticker", "normalized_score", "raw_score",
+         "annualized_return", "volatility", "max_drawdown",
+         "downside_deviation", "momentum", "trading_days"]
+    ].reset_index(drop=True)
@@ -1,10 +1,23 @@
-"""Fetch historical prices via yfinance and persist to SQLite."""
+"""Fetch historical prices (yfinance or local files) and persist to SQLite."""
 
 from __future__ import annotations
 
 import logging
+import random
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import nullcontext
 from datetime import datetime, timedelta
+from pathlib import Path
+from typing import NamedTuple
 
+import numpy as np
 import pandas as pd
 import yfinance as yf
 
@@ -12,12 +25,39 @@ from src.config import (
     CUSTOM_TICKERS,
     DEFAULT_TICKERS,
     HISTORY_YEARS,
+    PRICE_CACHE,
+    PRICE_CHUNK_SIZE,
+    PRICE_DOWNLOAD_ATTEMPTS,
+    PRICE_DOWNLOAD_WORKERS,
     PRICE_INTERVAL,
+    PRICE_OVERLAP_DAYS,
+    PRICE_RETRY_BACKOFF,
+    PRICE_SOURCE_DIR,
+    UNIVERSE_TTL_HOURS,
+)
+from src.db import (
+    bump_table_version,
+    days_to_dates,
+    deferred_indexes,
+    frame_rows,
+    get_connection,
+    get_earliest_price_dates,
+    get_latest_price_dates,
+    get_universe,
+    get_universe_age_hours,
+    init_db,
+    load_dataframe,
+    mark_dirty,
+    update_universe,
+    upsert_rows,
 )
-from src.db import init_db, get_connection
+from src.download_cache import cached_fetcher
 
 logger = logging.getLogger(__name__)
 
+# Relative change in adj_close below which a re-downloaded bar is unchanged
+_CLOSE_TOLERANCE = 1e-9
+
 
 def fetch_sp500_tickers() -> list[str]:
     """Scrape current S&P 500 constituents from Wikipedia."""
@@ -33,29 +73,298 @@ def fetch_sp500_tickers() -> list[str]:
         return []
 
 
-def get_ticker_universe() -> list[str]:
-    """Resolve ticker universe: custom > S&P 500 scrape > default fallback."""
+class UniverseDiff(NamedTuple):
+    """The resolved universe and its changes since the last resolution."""
+
+    tickers: list[str]
+    added: list[str]
+    removed: list[str]
+
+
+def refresh_universe(force: bool = False) -> UniverseDiff:
+    """
+    Resolve the ticker universe: custom > S&P 500 scrape > default fallback.
+
+    Scraped S&P 500 lists are recorded in the ``universe`` table with
+    effective dates, and the stored universe is reused without scraping
+    until the last scrape is older than ``UNIVERSE_TTL_HOURS`` (or
+    ``force`` is set). A failed scrape keeps the stored universe rather
+    than replacing it with the defaults. Custom and default lists are not
+    index membership, so they are used as-is without being recorded, and
+    the next run without them scrapes again.
+    """
+    init_db()
     if CUSTOM_TICKERS:
         logger.info("Using %d custom tickers", len(CUSTOM_TICKERS))
-        return CUSTOM_TICKERS
+        return UniverseDiff(list(CUSTOM_TICKERS), [], [])
 
-    sp500 = fetch_sp500_tickers()
-    if sp500:
-        return sp500
+    stored = get_universe()
+    age = get_universe_age_hours("sp500")
+    if (
+        stored and not force
+        and age is not None and age < UNIVERSE_TTL_HOURS
+    ):
+        logger.info(
+            "Using %d stored universe tickers (%.1fh old)", len(stored), age,
+        )
+        return UniverseDiff(stored, [], [])
+
+    tickers = fetch_sp500_tickers()
+    if not tickers and stored:
+        logger.warning(
+            "Keeping the stored universe of %d tickers", len(stored)
+        )
+        return UniverseDiff(stored, [], [])
+    if not tickers:
+        logger.info(
+            "Falling back to %d default tickers", len(DEFAULT_TICKERS)
+        )
+        return UniverseDiff(list(DEFAULT_TICKERS), [], [])
+
+    with get_connection() as conn:
+        added, removed = update_universe(conn, tickers, "sp500")
+    if added or removed:
+        logger.info(
+            "Universe changed: %d added %s, %d removed %s",
+            len(added), added[:10], len(removed), removed[:10],
+        )
+    return UniverseDiff(list(tickers), added, removed)
+
+
+def get_ticker_universe() -> list[str]:
+    """Return the current ticker universe (see ``refresh_universe``)."""
+    return refresh_universe().tickers
 
-    logger.info("Falling back to %d default tickers", len(DEFAULT_TICKERS))
-    return DEFAULT_TICKERS
 
+# A fetch backend: (tickers, start, end) -> a ``yf.download``-shaped frame
+# with (field, ticker) MultiIndex columns including Close and Volume.
+PriceFetcher = Callable[[list[str], str, str], pd.DataFrame]
 
-def pull_prices(tickers: list[str]) -> pd.DataFrame:
+
+class ChunkStats(NamedTuple):
+    """Timing of one downloaded chunk of tickers."""
+
+    index: int
+    tickers: int
+    rows: int
+    attempts: int
+    seconds: float
+
+
+def yfinance_fetcher(tickers: list[str], start: str, end: str) -> pd.DataFrame:
+    """Fetch adjusted prices from Yahoo Finance."""
+    # Concurrency comes from the chunk pool, not yfinance's own threads
+    return yf.download(
+        tickers,
+        start=start,
+        end=end,
+        interval=PRICE_INTERVAL,
+        auto_adjust=True,
+        threads=False,
+        progress=False,
+    )
+
+
+def default_fetcher() -> PriceFetcher:
+    """Yahoo Finance, read through the on-disk download cache if enabled."""
+    if PRICE_CACHE:
+        return cached_fetcher(yfinance_fetcher)
+    return yfinance_fetcher
+
+
+def _to_long(raw: pd.DataFrame, tickers: list[str]) -> pd.DataFrame:
     """
-    Bulk-download adjusted daily prices via yfinance.
+    Reshape a wide download into ticker, day, adj_close, volume rows.
 
-    Returns a long-format DataFrame with columns:
-        ticker, date, adj_close, volume
+    ``day`` counts days since 1970-01-01 and a missing volume is NaN. The
+    Close and Volume blocks are read as (dates x tickers) arrays and
+    flattened column-major, so each ticker's bars come out contiguous with
+    the ticker and day columns built by repeat/tile; no melt, merge or
+    per-row Python objects.
     """
+    if raw.empty:
+        return pd.DataFrame({
+            "ticker": pd.Series(dtype=object),
+            "day": pd.Series(dtype="int64"),
+            "adj_close": pd.Series(dtype=float),
+            "volume": pd.Series(dtype=float),
+        })
+
+    # yf.download returns MultiIndex columns (metric, ticker) for multiple
+    # tickers, or simple columns for a single ticker.
+    if isinstance(raw.columns, pd.MultiIndex):
+        close = raw["Close"]
+        volume = raw["Volume"].reindex(columns=close.columns)
+        symbols = close.columns.to_numpy()
+    else:
+        close = raw[["Close"]]
+        volume = raw[["Volume"]]
+        symbols = np.array(tickers[:1], dtype=object)
+
+    dates = pd.DatetimeIndex(raw.index)
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    days = dates.to_numpy(dtype="datetime64[D]").astype("int64")
+
+    adj_close = close.to_numpy(dtype=float).ravel(order="F")
+    keep = ~np.isnan(adj_close)
+    return pd.DataFrame({
+        "ticker": np.repeat(symbols, len(days))[keep],
+        "day": np.tile(days, len(symbols))[keep],
+        "adj_close": adj_close[keep],
+        "volume": volume.to_numpy(dtype=float).ravel(order="F")[keep],
+    })
+
+
+def _fetch_with_retry(
+    fetch: PriceFetcher,
+    tickers: list[str],
+    start: str,
+    end: str,
+    attempts: int,
+) -> tuple[pd.DataFrame, int]:
+    """
+    Fetch ``tickers`` in long format, backing off between failed attempts.
+
+    yf.download does not raise when individual tickers fail (throttling,
+    timeouts): it returns them empty or all-NaN. So an attempt fails for
+    every requested ticker that comes back without bars, and only those
+    are re-requested. Tickers still missing after the last attempt are
+    logged and left out; if none returned at all because every attempt
+    raised, the last error is re-raised. Returns (rows, attempts made).
+    """
+    frames = []
+    missing = list(tickers)
+    attempt = 1
+    while True:
+        error: Exception | None = None
+        try:
+            df = _to_long(fetch(missing, start, end), missing)
+        except Exception as exc:
+            error = exc
+        else:
+            frames.append(df)
+            returned = set(df["ticker"].unique())
+            missing = [ticker for ticker in missing if ticker not in returned]
+        if not missing:
+            break
+        if attempt >= attempts:
+            if error is not None and len(missing) == len(tickers):
+                raise error
+            logger.warning(
+                "No prices for %d tickers after %d attempts: %s",
+                len(missing), attempts, ", ".join(missing),
+            )
+            break
+        # Jitter keeps throttled chunks from retrying in lockstep
+        delay = PRICE_RETRY_BACKOFF * 2 ** (attempt - 1)
+        delay *= random.uniform(1.0, 1.5)
+        logger.warning(
+            "Fetch of %d tickers failed (attempt %d/%d): %s; "
+            "retrying in %.1fs",
+            len(missing), attempt, attempts,
+            error if error is not None else "no data returned", delay,
+        )
+        time.sleep(delay)
+        attempt += 1
+    return pd.concat(frames, ignore_index=True), attempt
+
+
+def iter_price_chunks(
+    tickers: list[str],
+    start: str,
+    end: str,
+    fetch: PriceFetcher = yfinance_fetcher,
+    chunk_size: int = PRICE_CHUNK_SIZE,
+    workers: int = PRICE_DOWNLOAD_WORKERS,
+    attempts: int = PRICE_DOWNLOAD_ATTEMPTS,
+) -> Iterator[tuple[ChunkStats, pd.DataFrame]]:
+    """
+    Download ``tickers`` in chunks on a bounded pool of ``workers``.
+
+    Each chunk is fetched in long format with up to ``attempts`` tries for
+    its missing tickers (see ``_fetch_with_retry``), then yielded with its
+    timing as soon as it completes. A chunk that exhausts its retries
+    without any data is logged and skipped; the others still load.
+    """
+    chunks = [
+        tickers[i:i + chunk_size] for i in range(0, len(tickers), chunk_size)
+    ]
+
+    def download(index: int) -> tuple[ChunkStats, pd.DataFrame]:
+        began = time.perf_counter()
+        df, tries = _fetch_with_retry(
+            fetch, chunks[index], start, end, attempts
+        )
+        elapsed = time.perf_counter() - began
+        return ChunkStats(
+            index, len(chunks[index]), len(df), tries, elapsed
+        ), df
+
+    if not chunks:
+        return
+    # Only ``workers`` chunks are in flight or awaiting the consumer at a
+    # time, so a slow consumer bounds memory instead of buffering them all
+    remaining = iter(range(len(chunks)))
+    pending: dict[Future, int] = {}
+    with ThreadPoolExecutor(
+        max_workers=min(workers, len(chunks)),
+        thread_name_prefix="prices",
+    ) as pool:
+
+        def submit_next() -> None:
+            for index in remaining:
+                pending[pool.submit(download, index)] = index
+                return
+
+        for _ in range(workers):
+            submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                submit_next()
+                try:
+                    stats, df = future.result()
+                except Exception as exc:
+                    logger.error(
+                        "Chunk %d/%d (%d tickers) failed after %d attempts: "
+                        "%s",
+                        index + 1, len(chunks), len(chunks[index]), attempts,
+                        exc,
+                    )
+                    continue
+                logger.info(
+                    "Chunk %d/%d: %d tickers, %d rows in %.2fs "
+                    "(%.0f rows/s, %d attempt(s))",
+                    index + 1, len(chunks), stats.tickers, stats.rows,
+                    stats.seconds, stats.rows / max(stats.seconds, 1e-9),
+                    stats.attempts,
+                )
+                yield stats, df
+
+
+def iter_pull_prices(
+    tickers: list[str],
+    start: str | None = None,
+    fetch: PriceFetcher | None = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Download adjusted daily prices through ``fetch``, chunk by chunk.
+
+    Downloads from ``start`` (YYYY-MM-DD) through today, or the full
+    ``HISTORY_YEARS`` window when ``start`` is None, in concurrent chunks
+    (see ``iter_price_chunks``).
+
+    Yields long-format DataFrames with columns:
+        ticker, day (days since 1970-01-01), adj_close, volume
+    """
+    fetch = fetch or default_fetcher()
     end = datetime.today()
-    start = end - timedelta(days=HISTORY_YEARS * 365)
+    start = (
+        datetime.strptime(start, "%Y-%m-%d") if start
+        else end - timedelta(days=HISTORY_YEARS * 365)
+    )
 
     logger.info(
         "Downloading prices for %d tickers (%s to %s)",
@@ -64,74 +373,390 @@ def pull_prices(tickers: list[str]) -> pd.DataFrame:
         end.strftime("%Y-%m-%d"),
     )
 
-    raw = yf.download(
+    began = time.perf_counter()
+    rows = downloaded = 0
+    for _, df in iter_price_chunks(
         tickers,
-        start=start.strftime("%Y-%m-%d"),
-        end=end.strftime("%Y-%m-%d"),
-        interval=PRICE_INTERVAL,
-        auto_adjust=True,
-        threads=True,
-        progress=False,
+        start.strftime("%Y-%m-%d"),
+        end.strftime("%Y-%m-%d"),
+        fetch=fetch,
+    ):
+        rows += len(df)
+        downloaded += df["ticker"].nunique()
+        yield df
+    elapsed = time.perf_counter() - began
+
+    if not rows:
+        logger.error("No price data returned")
+        return
+    logger.info(
+        "Downloaded %d price rows for %d tickers in %.1fs (%.0f rows/s)",
+        rows,
+        downloaded,
+        elapsed,
+        rows / max(elapsed, 1e-9),
     )
 
-    if raw.empty:
-        logger.error("yfinance returned no data")
+
+def pull_prices(
+    tickers: list[str],
+    start: str | None = None,
+    fetch: PriceFetcher | None = None,
+) -> pd.DataFrame:
+    """
+    Bulk-download adjusted daily prices into a single frame.
+
+    Same as ``iter_pull_prices`` with the chunks concatenated; the
+    pipeline itself streams chunks into the DB instead.
+
+    Returns a long-format DataFrame with columns:
+        ticker, date, adj_close, volume
+    """
+    frames = list(iter_pull_prices(tickers, start=start, fetch=fetch))
+    if not frames:
         return pd.DataFrame(columns=["ticker", "date", "adj_close", "volume"])
+    df = pd.concat(frames, ignore_index=True)
+    return pd.DataFrame({
+        "ticker": df["ticker"],
+        "date": days_to_dates(df["day"]),
+        "adj_close": df["adj_close"],
+        "volume": df["volume"].astype("Int64"),
+    })
 
-    # yf.download returns MultiIndex columns (metric, ticker) for multiple
-    # tickers, or simple columns for a single ticker.
-    if isinstance(raw.columns, pd.MultiIndex):
-        close = raw["Close"].copy()
-        volume = raw["Volume"].copy()
+
+def _download_starts(tickers: list[str]) -> dict[str | None, list[str]]:
+    """
+    Group tickers by the date their download should start from.
+
+    Stored tickers resume ``PRICE_OVERLAP_DAYS`` before their latest bar;
+    new tickers (key None) need the full history.
+    """
+    latest = get_latest_price_dates()
+    overlap = timedelta(days=PRICE_OVERLAP_DAYS)
+    groups: dict[str | None, list[str]] = {}
+    for ticker in tickers:
+        start = None
+        if ticker in latest:
+            start = (
+                datetime.strptime(latest[ticker], "%Y-%m-%d") - overlap
+            ).strftime("%Y-%m-%d")
+        groups.setdefault(start, []).append(ticker)
+    return groups
+
+
+def _restatement_starts(
+    tickers: list[str],
+) -> dict[str | None, list[str]]:
+    """
+    Group restated tickers by the date their re-download should start from.
+
+    The whole stored history is replaced, so no older bar keeps the old
+    adjustment basis: tickers stored from before the ``HISTORY_YEARS``
+    window restart at their earliest bar, the rest (key None) at the
+    window's start.
+    """
+    earliest = get_earliest_price_dates()
+    window = (
+        datetime.today() - timedelta(days=HISTORY_YEARS * 365)
+    ).strftime("%Y-%m-%d")
+    groups: dict[str | None, list[str]] = {}
+    for ticker in tickers:
+        start = earliest.get(ticker)
+        groups.setdefault(
+            start if start is not None and start < window else None, []
+        ).append(ticker)
+    return groups
+
+
+def _price_rows(df: pd.DataFrame) -> Iterator[tuple]:
+    """
+    Stream (ticker, day, adj_close, volume) rows for ``upsert_rows``.
+
+    NaN volumes bind as NULL; whole float volumes are stored as integers
+    by the columns' INTEGER affinity.
+    """
+    return frame_rows(df, ["ticker", "day", "adj_close", "volume"])
+
+
+def _restated_tickers(df: pd.DataFrame) -> list[str]:
+    """Tickers whose already-stored closes differ in the download ``df``."""
+    stored = load_dataframe(
+        """
+        SELECT t.symbol AS ticker, b.day, b.adj_close AS stored_close
+        FROM price_bars b
+        JOIN tickers t ON t.id = b.ticker_id
+        WHERE b.day >= ?
+        """,
+        (int(df["day"].min()),),
+    )
+    overlap = df.merge(stored, on=["ticker", "day"])
+    restated = (
+        (overlap["adj_close"] - overlap["stored_close"]).abs()
+        > _CLOSE_TOLERANCE * overlap["adj_close"].abs()
+    )
+    return sorted(overlap.loc[restated, "ticker"].unique())
+
+
+def _save_prices(df: pd.DataFrame) -> tuple[int, list[str]]:
+    """
+    Upsert one downloaded chunk in its own transaction.
+
+    Only new or changed rows are written; their tickers are queued in
+    ``dirty_tickers`` for the metrics stage. Returns (rows written,
+    tickers changed).
+    """
+    with get_connection() as conn:
+        # Stage the download, then only touch rows that are new or changed;
+        # the pooled connection may still hold the table from a failed run
+        conn.execute("DROP TABLE IF EXISTS temp.incoming_prices")
+        conn.execute(
+            """
+            CREATE TEMP TABLE incoming_prices (
+                ticker TEXT, day INTEGER, adj_close REAL, volume INTEGER
+            )
+            """
+        )
+        upsert_rows(
+            conn,
+            "incoming_prices",
+            ["ticker", "day", "adj_close", "volume"],
+            _price_rows(df),
+        )
+        conn.execute(
+            """
+            INSERT INTO tickers (symbol)
+            SELECT DISTINCT ticker FROM incoming_prices
+            WHERE ticker NOT IN (SELECT symbol FROM tickers)
+            """
+        )
+        changed = """
+            FROM incoming_prices i
+            JOIN tickers t ON t.symbol = i.ticker
+            LEFT JOIN price_bars p ON p.ticker_id = t.id AND p.day = i.day
+            WHERE p.ticker_id IS NULL
+                OR ABS(p.adj_close - i.adj_close) > ? * ABS(i.adj_close)
+                OR p.volume IS NOT i.volume
+        """
+        dirty = [
+            row[0] for row in conn.execute(
+                f"SELECT DISTINCT i.ticker {changed}",  # noqa: S608
+                (_CLOSE_TOLERANCE,),
+            )
+        ]
+        written = conn.execute(
+            f"""
+            INSERT INTO price_bars (ticker_id, day, adj_close, volume)
+            SELECT t.id, i.day, i.adj_close, i.volume {changed}
+            ON CONFLICT (ticker_id, day) DO UPDATE SET
+                adj_close = excluded.adj_close, volume = excluded.volume
+            """,  # noqa: S608
+            (_CLOSE_TOLERANCE,),
+        ).rowcount
+        conn.execute("DROP TABLE incoming_prices")
+
+        if dirty:
+            mark_dirty(conn, dirty, "metrics")
+            bump_table_version(conn, "prices")
+
+    return written, dirty
+
+
+def _parse_days(dates: pd.Series) -> np.ndarray:
+    """
+    Parse a file's dates to calendar days, ignoring any UTC offsets.
+
+    Exports with offsets switch between them across DST changes, which
+    pd.to_datetime rejects as mixed timezones. Daily bars are stamped at
+    the exchange's local midnight, so the offset is dropped rather than
+    converted (to UTC, midnight east of Greenwich is the previous day).
+    """
+    if isinstance(dates.dtype, pd.DatetimeTZDtype):
+        parsed = dates.dt.tz_localize(None)
+    else:
+        parsed = pd.to_datetime(
+            dates.astype(str).str.replace(
+                r"(?<=\d)(?:Z|[+-]\d{2}:?\d{2})$", "", regex=True
+            )
+        )
+    return parsed.to_numpy(dtype="datetime64[D]")
+
+
+def _read_price_file(path: Path) -> pd.DataFrame:
+    """
+    Read one CSV or Parquet price file into ticker, day, adj_close, volume.
+
+    ``day`` counts days since 1970-01-01 and a missing volume is NaN.
+
+    Columns are matched case-insensitively: date, adj_close (or "Adj
+    Close", falling back to close) and an optional volume. Without a ticker
+    column the ticker comes from a ``ticker=XYZ`` partition directory or
+    else the file name, so both one-file-per-ticker layouts and
+    partitioned datasets load. Parquet needs the optional pyarrow package.
+    """
+    if path.suffix == ".parquet":
+        try:
+            raw = pd.read_parquet(path)
+        except ImportError as exc:
+            raise ImportError(
+                f"Reading {path} needs pyarrow: pip install pyarrow"
+            ) from exc
+    else:
+        raw = pd.read_csv(path)
+    raw.columns = [
+        str(col).strip().lower().replace(" ", "_") for col in raw.columns
+    ]
+    close = "adj_close" if "adj_close" in raw.columns else "close"
+    if "ticker" in raw.columns:
+        ticker = raw["ticker"].astype(str).to_numpy()
     else:
-        # Single ticker — wrap into DataFrame with that ticker as column
-        t = tickers[0]
-        close = raw[["Close"]].rename(columns={"Close": t})
-        volume = raw[["Volume"]].rename(columns={"Volume": t})
-
-    # Melt to long format
-    close_long = close.reset_index().melt(
-        id_vars="Date", var_name="ticker", value_name="adj_close"
+        partition = path.parent.name
+        ticker = (
+            partition.split("=", 1)[1] if partition.startswith("ticker=")
+            else path.stem
+        )
+
+    adj_close = raw[close].to_numpy(dtype=float)
+    keep = ~np.isnan(adj_close)
+    days = _parse_days(raw["date"])
+    volume = (
+        raw["volume"].to_numpy(dtype=float) if "volume" in raw.columns
+        else np.full(len(raw), np.nan)
     )
-    volume_long = volume.reset_index().melt(
-        id_vars="Date", var_name="ticker", value_name="volume"
+    return pd.DataFrame({
+        "ticker": ticker if np.isscalar(ticker) else ticker[keep],
+        "day": days[keep].astype("int64"),
+        "adj_close": adj_close[keep],
+        "volume": volume[keep],
+    })
+
+
+def load_price_files(directory: Path) -> int:
+    """
+    Bulk-load every CSV and Parquet file under ``directory`` into the DB.
+
+    A network-free way to (re)build ``market.db`` for backfills, disaster
+    recovery and benchmarks. Files are read one at a time and upserted
+    straight into ``price_bars`` in a single transaction, skipping the
+    per-row change detection of downloads (and deferring the secondary
+    index when the table starts empty); every loaded ticker is queued for
+    the metrics stage. Returns the number of rows loaded.
+    """
+    files = sorted(
+        path for path in Path(directory).rglob("*")
+        if path.suffix in (".csv", ".parquet")
     )
+    if not files:
+        logger.warning("No CSV or Parquet price files in %s", directory)
+        return 0
 
-    df = close_long.merge(volume_long, on=["Date", "ticker"])
-    df = df.rename(columns={"Date": "date"})
-    df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
-    df = df.dropna(subset=["adj_close"])
-    df["volume"] = df["volume"].astype("Int64")
+    init_db()
+    loaded = 0
+    symbols: set[str] = set()
+    with get_connection() as conn:
+        ids = dict(conn.execute("SELECT symbol, id FROM tickers"))
+        # Into an empty table (a full rebuild), building the day index once
+        # after the load is cheaper than maintaining it row by row
+        reload = conn.execute(
+            "SELECT 1 FROM price_bars LIMIT 1"
+        ).fetchone() is None
+        with deferred_indexes(conn, "price_bars") if reload else nullcontext():
+            for path in files:
+                df = _read_price_file(path)
+                new = set(df["ticker"].unique()) - ids.keys()
+                if new:
+                    conn.executemany(
+                        "INSERT INTO tickers (symbol) VALUES (?)",
+                        ((symbol,) for symbol in sorted(new)),
+                    )
+                    ids = dict(conn.execute("SELECT symbol, id FROM tickers"))
+                loaded += upsert_rows(
+                    conn,
+                    "price_bars",
+                    ["ticker_id", "day", "adj_close", "volume"],
+                    _price_rows(df.assign(ticker=df["ticker"].map(ids))),
+                    key=["ticker_id", "day"],
+                )
+                symbols.update(df["ticker"].unique())
+
+        if symbols:
+            mark_dirty(conn, symbols, "metrics")
+            bump_table_version(conn, "prices")
 
     logger.info(
-        "Downloaded %d price rows for %d tickers",
-        len(df),
-        df["ticker"].nunique(),
+        "Loaded %d price rows for %d tickers from %d files in %s",
+        loaded,
+        len(symbols),
+        len(files),
+        directory,
     )
-    return df[["ticker", "date", "adj_close", "volume"]]
+    return loaded
+
+
+def refresh_prices(fetch: PriceFetcher | None = None) -> None:
+    """
+    Main entry point: resolve tickers, download prices, upsert into DB.
+
+    Prices come from ``fetch`` (default: ``default_fetcher``). Stored tickers
+    are only downloaded from ``PRICE_OVERLAP_DAYS`` before their latest
+    bar, with tickers sharing a start date fetched together; any whose
+    overlapping closes were restated (e.g. a dividend moved every adjusted
+    close) are then re-downloaded over their whole stored history.
+
+    Each chunk is written as soon as it arrives, so memory is bounded by
+    the chunk size rather than the universe. Only new or changed rows are
+    written, and their tickers are queued in ``dirty_tickers`` for the
+    metrics stage.
 
+    With ``PRICE_SOURCE_DIR`` set, prices are bulk-loaded from that
+    directory instead (see ``load_price_files``).
+    """
+    if PRICE_SOURCE_DIR is not None:
+        load_price_files(PRICE_SOURCE_DIR)
+        return
 
-def refresh_prices() -> None:
-    """Main entry point: resolve tickers, download prices, upsert into DB."""
     init_db()
+    fetch = fetch or default_fetcher()
     tickers = get_ticker_universe()
-    df = pull_prices(tickers)
+    downloaded = written = 0
+    dirty: set[str] = set()
+    restated: list[str] = []
 
-    if df.empty:
-        logger.warning("No price data to save")
-        return
+    def ingest(df: pd.DataFrame) -> None:
+        nonlocal downloaded, written
+        rows, changed = _save_prices(df)
+        downloaded += len(df)
+        written += rows
+        dirty.update(changed)
 
-    with get_connection() as conn:
-        # Use INSERT OR REPLACE for upsert behavior
-        conn.executemany(
-            """
-            INSERT OR REPLACE INTO prices (ticker, date, adj_close, volume)
-            VALUES (?, ?, ?, ?)
-            """,
-            df[["ticker", "date", "adj_close", "volume"]].values.tolist(),
+    for start, group in _download_starts(tickers).items():
+        for df in iter_pull_prices(group, start=start, fetch=fetch):
+            if df.empty:
+                continue
+            if start is not None:
+                found = _restated_tickers(df)
+                restated += found
+                df = df[~df["ticker"].isin(found)]
+            ingest(df)
+
+    if restated:
+        logger.info(
+            "Re-downloading full history for %d restated tickers",
+            len(restated),
         )
+        for start, group in _restatement_starts(restated).items():
+            for df in iter_pull_prices(group, start=start, fetch=fetch):
+                ingest(df)
 
-    logger.info("Saved %d price rows to database", len(df))
+    if not downloaded:
+        logger.warning("No price data to save")
+        return
+
+    logger.info(
+        "Saved %d new or changed price rows for %d tickers (%d downloaded)",
+        written,
+        len(dirty),
+        downloaded,
+    )
 
 
 if __name__ == "__main__":
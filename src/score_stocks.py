@@ -3,18 +3,54 @@
 from __future__ import annotations
 
 import logging
+from typing import TYPE_CHECKING
 
+import numpy as np
 import pandas as pd
 
-from src.config import RISK_PROFILES
-from src.db import get_connection, init_db, load_dataframe
+from src.config import (
+    DIRTY_TICKERS_ONLY,
+    METRICS_FULL_HISTORY,
+    RISK_PROFILES,
+    SCORING_WINDOW_MONTHS,
+)
+from src.db import (
+    clear_dirty,
+    frame_rows,
+    get_connection,
+    get_dirty_tickers,
+    get_latest_run,
+    get_published_run,
+    init_db,
+    load_dataframe,
+    publish_run,
+    upsert_rows,
+)
+
+if TYPE_CHECKING:
+    from src.compute_metrics import MetricsRun
 
 logger = logging.getLogger(__name__)
 
 
-def _score_profile(metrics: pd.DataFrame, profile: str) -> pd.DataFrame:
+def factor_matrix(metrics: pd.DataFrame) -> np.ndarray:
     """
-    Apply scoring formula for a single risk profile.
+    Stack the scoring inputs into an (n_tickers x 5) factor matrix.
+
+    Columns: annualized_return, volatility, |max_drawdown|,
+    downside_deviation, momentum.
+    """
+    factors = metrics[
+        ["annualized_return", "volatility", "max_drawdown",
+         "downside_deviation", "momentum"]
+    ].to_numpy(dtype=float, copy=True)
+    factors[:, 2] = np.abs(factors[:, 2])
+    return factors
+
+
+def weight_matrix(profiles: dict[str, dict[str, float]]) -> np.ndarray:
+    """
+    Stack profile weights into a (5 x n_profiles) matrix.
 
     raw_score = annualized_return
                 - α * volatility
@@ -22,83 +58,168 @@ def _score_profile(metrics: pd.DataFrame, profile: str) -> pd.DataFrame:
                 - γ * downside_deviation
                 + δ * momentum
     """
-    weights = RISK_PROFILES[profile]
-    alpha = weights["alpha"]
-    beta = weights["beta"]
-    gamma = weights["gamma"]
-    delta = weights["delta"]
-
-    df = metrics.copy()
-    df["raw_score"] = (
-        df["annualized_return"]
-        - alpha * df["volatility"]
-        - beta * df["max_drawdown"].abs()
-        - gamma * df["downside_deviation"]
-        + delta * df["momentum"]
-    )
+    return np.array([
+        [1.0, -w["alpha"], -w["beta"], -w["gamma"], w["delta"]]
+        for w in profiles.values()
+    ]).T
 
-    # Percentile rank: 0 = worst, 1 = best
-    df["normalized_score"] = df["raw_score"].rank(pct=True)
-    df["rank"] = df["raw_score"].rank(ascending=False, method="min").astype(int)
-    df["risk_profile"] = profile
 
-    return df[["ticker", "as_of_date", "risk_profile", "raw_score",
-               "normalized_score", "rank"]]
+def score_profiles(
+    metrics: pd.DataFrame,
+    profiles: dict[str, dict[str, float]] = RISK_PROFILES,
+) -> pd.DataFrame:
+    """
+    Score and rank every ticker under every profile in one shot.
 
+    Raw scores for all profiles are a single (tickers x 5) @ (5 x profiles)
+    product, and percentile ranks are taken per date for all profile
+    columns at once, so arbitrarily many weight sets (e.g. client-specific
+    profiles) cost one matrix multiply rather than a copy per profile.
 
-def score_all_profiles() -> pd.DataFrame:
-    """Score all tickers across every configured risk profile."""
-    metrics = load_dataframe(
-        """
-        SELECT ticker, as_of_date, annualized_return, volatility,
-               downside_deviation, max_drawdown, momentum
-        FROM metrics
-        WHERE as_of_date = (SELECT MAX(as_of_date) FROM metrics)
-        """
-    )
+    Returns long-format rows: ticker, as_of_date, risk_profile, raw_score,
+    normalized_score, rank.
+    """
+    raw = factor_matrix(metrics) @ weight_matrix(profiles)
+    raw_df = pd.DataFrame(raw, columns=list(profiles), index=metrics.index)
+
+    # Percentile rank within each date: 0 = worst, 1 = best
+    by_date = raw_df.groupby(metrics["as_of_date"].to_numpy())
+    normalized = by_date.rank(pct=True).to_numpy()
+    rank = by_date.rank(ascending=False, method="min").to_numpy()
+
+    n_tickers, n_profiles = raw.shape
+    df = pd.DataFrame({
+        "ticker": np.tile(metrics["ticker"].to_numpy(), n_profiles),
+        "as_of_date": np.tile(metrics["as_of_date"].to_numpy(), n_profiles),
+        "risk_profile": np.repeat(list(profiles), n_tickers),
+        "raw_score": raw.T.ravel(),
+        "normalized_score": normalized.T.ravel(),
+        "rank": rank.T.ravel(),
+    })
+
+    # Tickers without a full metric window cannot be ranked
+    return df.dropna(subset=["raw_score"]).astype({"rank": int})
+
+
+def score_all_profiles(
+    all_dates: bool = METRICS_FULL_HISTORY,
+    run_id: int | None = None,
+    metrics: pd.DataFrame | None = None,
+) -> pd.DataFrame:
+    """
+    Score all tickers across every configured risk profile.
+
+    Scores use the ``SCORING_WINDOW_MONTHS`` metrics window of ``run_id``
+    (default: the newest metrics run), or of ``metrics`` when a run's rows
+    are already in memory. Only the run's latest date is scored unless
+    ``all_dates`` is set, in which case every date it holds is ranked
+    independently.
+    """
+    if metrics is not None:
+        metrics = metrics[metrics["window_months"] == SCORING_WINDOW_MONTHS]
+        if not all_dates and not metrics.empty:
+            metrics = metrics[
+                metrics["as_of_date"] == metrics["as_of_date"].max()
+            ]
+        metrics = metrics.reset_index(drop=True)
+    else:
+        if run_id is None:
+            run_id = get_latest_run("metrics")
+        date_clause = (
+            "" if all_dates
+            else """AND as_of_date = (
+                SELECT MAX(as_of_date) FROM metrics WHERE run_id = ?
+            )"""
+        )
+        metrics = load_dataframe(
+            f"""
+            SELECT ticker, as_of_date, annualized_return, volatility,
+                   downside_deviation, max_drawdown, momentum
+            FROM metrics
+            WHERE run_id = ? AND window_months = ?
+                {date_clause}
+            """,
+            (run_id, SCORING_WINDOW_MONTHS)
+            + (() if all_dates else (run_id,)),
+        )
 
     if metrics.empty:
         logger.warning("No metrics found in database")
         return pd.DataFrame()
 
-    frames = []
-    for profile in RISK_PROFILES:
-        scored = _score_profile(metrics, profile)
-        frames.append(scored)
+    scores = score_profiles(metrics)
+    for profile, scored in scores.groupby("risk_profile", sort=False):
         logger.info(
             "Profile '%s': scored %d tickers (top: %s)",
             profile,
             len(scored),
-            scored.sort_values("rank").iloc[0]["ticker"] if len(scored) > 0 else "N/A",
+            scored.sort_values(["as_of_date", "rank"], ascending=[False, True])
+            .iloc[0]["ticker"] if len(scored) > 0 else "N/A",
         )
 
-    return pd.concat(frames, ignore_index=True)
+    return scores.reset_index(drop=True)
+
 
+def refresh_scores(
+    dirty_only: bool = DIRTY_TICKERS_ONLY,
+    run: MetricsRun | None = None,
+) -> pd.DataFrame:
+    """
+    Main entry point: compute scores and upsert into DB.
 
-def refresh_scores() -> None:
-    """Main entry point: compute scores and upsert into DB."""
+    Percentile ranks are cross-sectional, so any changed ticker re-ranks
+    the whole universe; with ``dirty_only`` the run is skipped when no
+    ticker's metrics changed since scores were last written.
+
+    Scores are written under the newest metrics run, which is then
+    published in the same transaction, so readers switch from one
+    complete snapshot of metrics and scores to the next atomically.
+
+    Given the ``run`` just returned by ``refresh_metrics``, its in-memory
+    metrics are scored instead of being read back; if that run was not
+    persisted, the scores are only returned. Returns the scores computed.
+    """
     init_db()
-    df = score_all_profiles()
+    if run is not None:
+        run_id = run.run_id
+        df = score_all_profiles(metrics=run.metrics)
+    else:
+        run_id = get_latest_run("metrics")
+        if (
+            dirty_only
+            and not get_dirty_tickers("scores")
+            and run_id == get_published_run()
+        ):
+            logger.info("No metrics changed since the last run")
+            return pd.DataFrame()
+        df = score_all_profiles(run_id=run_id)
 
     if df.empty:
         logger.warning("No scores to save")
-        return
+        return df
+    if run_id is None:
+        return df
 
     with get_connection() as conn:
-        conn.executemany(
-            """
-            INSERT OR REPLACE INTO scores
-                (ticker, as_of_date, risk_profile, raw_score,
-                 normalized_score, rank)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            df[
-                ["ticker", "as_of_date", "risk_profile", "raw_score",
-                 "normalized_score", "rank"]
-            ].values.tolist(),
+        columns = [
+            "run_id", "ticker", "as_of_date", "risk_profile", "raw_score",
+            "normalized_score", "rank",
+        ]
+        upsert_rows(
+            conn,
+            "scores",
+            columns,
+            frame_rows(df.assign(run_id=run_id), columns),
+            key=["run_id", "ticker", "as_of_date", "risk_profile"],
         )
+        publish_run(conn, run_id)
+        clear_dirty(conn, "scores")
 
-    logger.info("Saved scores for %d ticker-profile pairs", len(df))
+    logger.info(
+        "Published run %d with scores for %d ticker-profile pairs",
+        run_id, len(df),
+    )
+    return df
 
 
 if __name__ == "__main__":
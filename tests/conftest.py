@@ -0,0 +1,16 @@
+"""Shared fixtures: every test runs against its own throwaway database."""
+
+from pathlib import Path
+
+import pytest
+
+import src.db
+
+
+@pytest.fixture
+def tmp_db(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Point the db layer at an empty, initialised database under tmp_path."""
+    monkeypatch.setattr(src.db, "DB_PATH", tmp_path / "market.db")
+    src.db.init_db()
+    yield src.db.DB_PATH
+    src.db.close_connections()
@@ -0,0 +1,143 @@
+"""Tests for metric computation and its run bookkeeping."""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.compute_metrics
+import src.matrix_cache
+from src.db import (
+    execute_query,
+    get_connection,
+    get_dirty_tickers,
+    mark_dirty,
+    save_dataframe,
+)
+
+
+def _save_prices(tickers: list[str], n_days: int = 300) -> None:
+    """Write random-walk closes through the prices view."""
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range(end="2026-01-30", periods=n_days)
+    save_dataframe(
+        pd.DataFrame({
+            "ticker": np.repeat(tickers, n_days),
+            "date": np.tile(dates.strftime("%Y-%m-%d"), len(tickers)),
+            "adj_close": 100.0 * np.cumprod(
+                1.0 + rng.normal(0.0004, 0.02, n_days * len(tickers))
+            ),
+            "volume": 1_000,
+        }),
+        "prices",
+    )
+
+
+def test_prices_view_writes_queue_tickers(tmp_db: Path) -> None:
+    _save_prices(["AAA", "BBB"], n_days=3)
+    assert get_dirty_tickers("metrics") == ["AAA", "BBB"]
+
+
+def test_changed_settings_recompute_every_ticker(
+    tmp_db: Path, monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _save_prices(["AAA", "BBB", "CCC"])
+    first = src.compute_metrics.refresh_metrics(dirty_only=True)
+    assert first is not None
+    assert src.compute_metrics.refresh_metrics(dirty_only=True) is None
+
+    monkeypatch.setattr(src.compute_metrics, "MOMENTUM_3M_WEIGHT", 0.9)
+    second = src.compute_metrics.refresh_metrics(dirty_only=True)
+
+    assert second is not None and second.run_id > first.run_id
+    expected = src.compute_metrics.compute_all_metrics()
+    got = second.metrics.sort_values(["window_months", "ticker"])
+    np.testing.assert_allclose(
+        got["momentum"].to_numpy(),
+        expected.sort_values(["window_months", "ticker"])["momentum"],
+    )
+    assert not np.allclose(
+        got["momentum"].to_numpy(),
+        first.metrics.sort_values(["window_months", "ticker"])["momentum"],
+    )
+
+
+def test_incremental_rebuild_in_blocks_matches_full_compute(
+    tmp_db: Path, monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _save_prices(["AAA", "BBB", "CCC", "DDD", "EEE"])
+    expected = src.compute_metrics.compute_all_metrics()
+    blocks = []
+    iter_blocks = src.compute_metrics.iter_price_blocks
+
+    def small_blocks(tickers: list[str]) -> pd.DataFrame:
+        for block in iter_blocks(block_size=2, tickers=tickers):
+            blocks.append(block["ticker"].nunique())
+            yield block
+
+    monkeypatch.setattr(src.compute_metrics, "iter_price_blocks", small_blocks)
+    got, _ = src.compute_metrics.compute_incremental_metrics()
+
+    columns = ["window_months", "ticker"]
+    pd.testing.assert_frame_equal(
+        got.sort_values(columns).reset_index(drop=True)[expected.columns],
+        expected.sort_values(columns).reset_index(drop=True),
+        check_dtype=False,
+    )
+    assert blocks == [2, 2, 1] * 3
+
+
+def test_dirty_ticker_without_prices_drops_out(tmp_db: Path) -> None:
+    _save_prices(["AAA", "BBB", "CCC"])
+    assert src.compute_metrics.refresh_metrics(dirty_only=True) is not None
+
+    execute_query("DELETE FROM prices WHERE ticker = 'CCC'")
+    assert get_dirty_tickers("metrics") == ["CCC"]
+    run = src.compute_metrics.refresh_metrics(dirty_only=True)
+
+    assert run is not None
+    assert sorted(run.metrics["ticker"].unique()) == ["AAA", "BBB"]
+    assert get_dirty_tickers("metrics") == []
+
+
+def test_matrix_cache_ignores_tickers_without_prices(
+    tmp_db: Path, monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(src.compute_metrics, "PRICE_MATRIX_CACHE", True)
+    monkeypatch.setattr(
+        src.matrix_cache, "MATRIX_CACHE_DIR", tmp_db.parent / "matrix_cache"
+    )
+    _save_prices(["AAA", "BBB", "CCC"])
+    assert src.compute_metrics.refresh_metrics(dirty_only=True) is not None
+
+    execute_query("DELETE FROM prices WHERE ticker = 'AAA'")
+    run = src.compute_metrics.refresh_metrics(dirty_only=True)
+
+    assert run is not None
+    assert sorted(run.metrics["ticker"]) == ["BBB"] * 3 + ["CCC"] * 3
+
+
+def test_tickers_queued_during_a_run_stay_queued(
+    tmp_db: Path, monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _save_prices(["AAA", "BBB"])
+    assert src.compute_metrics.refresh_metrics(dirty_only=True) is not None
+    with get_connection() as conn:
+        mark_dirty(conn, ["AAA"], "metrics")
+    compute = src.compute_metrics.compute_all_metrics
+
+    def compute_then_queue(**kwargs) -> pd.DataFrame:
+        df = compute(**kwargs)
+        # A concurrent price refresh lands after the queue was read
+        execute_query("DELETE FROM prices WHERE ticker = 'BBB'")
+        return df
+
+    monkeypatch.setattr(
+        src.compute_metrics, "compute_all_metrics", compute_then_queue
+    )
+    run = src.compute_metrics.refresh_metrics(dirty_only=True)
+
+    assert run is not None
+    assert sorted(run.metrics["ticker"]) == ["AAA"] * 3 + ["BBB"] * 3
+    assert get_dirty_tickers("metrics") == ["BBB"]
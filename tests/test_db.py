@@ -0,0 +1,79 @@
+"""Tests for the SQLite data access layer."""
+
+import sqlite3
+from pathlib import Path
+
+from src.db import (
+    begin_run,
+    execute_query,
+    get_connection,
+    init_db,
+    publish_run,
+)
+
+
+def _write_metrics(run_id: int, dates: list[str]) -> None:
+    with get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO metrics (run_id, ticker, as_of_date, window_months) "
+            "VALUES (?, 'AAA', ?, 12)",
+            ((run_id, date) for date in dates),
+        )
+
+
+def _metric_rows() -> list[tuple[int, str]]:
+    return execute_query(
+        "SELECT run_id, as_of_date FROM metrics ORDER BY as_of_date, run_id"
+    )
+
+
+def test_publish_prunes_superseded_rows_and_keeps_history(
+    tmp_db: Path,
+) -> None:
+    runs = []
+    for dates in (
+        ["2026-01-01", "2026-01-02"],
+        ["2026-01-02", "2026-01-03"],
+        ["2026-01-02", "2026-01-03"],   # never published
+        ["2026-01-03", "2026-01-04"],
+        ["2026-01-04"],
+    ):
+        with get_connection() as conn:
+            runs.append(begin_run(conn))
+        _write_metrics(runs[-1], dates)
+        if len(runs) != 3:
+            with get_connection() as conn:
+                publish_run(conn, runs[-1])
+
+    # Each date keeps only its newest published version, except that the
+    # replaced run (runs[3]) stays whole for readers still querying it;
+    # the unpublished run supersedes nothing
+    assert _metric_rows() == [
+        (runs[0], "2026-01-01"),
+        (runs[1], "2026-01-02"),
+        (runs[2], "2026-01-02"),
+        (runs[3], "2026-01-03"),
+        (runs[3], "2026-01-04"),
+        (runs[4], "2026-01-04"),
+    ]
+
+
+def test_pooled_connections_follow_a_replaced_database(tmp_db: Path) -> None:
+    execute_query("INSERT INTO tickers (symbol) VALUES ('OLD')")
+    assert execute_query("SELECT symbol FROM tickers", readonly=True) == [
+        ("OLD",)
+    ]
+
+    # As ``make clean`` does while the API keeps its pooled connections
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{tmp_db}{suffix}").unlink(missing_ok=True)
+    init_db()
+    execute_query("INSERT INTO tickers (symbol) VALUES ('NEW')")
+
+    with sqlite3.connect(tmp_db) as conn:
+        assert conn.execute("SELECT symbol FROM tickers").fetchall() == [
+            ("NEW",)
+        ]
+    assert execute_query("SELECT symbol FROM tickers", readonly=True) == [
+        ("NEW",)
+    ]
@@ -0,0 +1,54 @@
+"""Tests for the on-disk download cache."""
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import src.download_cache
+
+
+def test_empty_downloads_are_refetched(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(src.download_cache, "PRICE_CACHE_DIR", tmp_path)
+    dates = pd.bdate_range("2026-01-05", periods=3, name="Date")
+    requests = []
+
+    def fetch(tickers: list[str], start: str, end: str) -> pd.DataFrame:
+        # AAA is throttled on the first request and returned all-NaN
+        requests.append(list(tickers))
+        close = pd.DataFrame(100.0, index=dates, columns=tickers)
+        if len(requests) == 1:
+            close["AAA"] = float("nan")
+        return pd.concat({"Close": close, "Volume": close}, axis=1)
+
+    fetch_cached = src.download_cache.cached_fetcher(fetch)
+    fetch_cached(["AAA", "BBB"], "2026-01-05", "2026-01-10")
+    raw = fetch_cached(["AAA", "BBB"], "2026-01-05", "2026-01-10")
+
+    assert requests == [["AAA", "BBB"], ["AAA"]]
+    assert raw["Close"]["AAA"].notna().all()
+
+
+def test_unreadable_entries_are_refetched(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(src.download_cache, "PRICE_CACHE_DIR", tmp_path)
+    dates = pd.bdate_range("2026-01-05", periods=3, name="Date")
+    requests = []
+
+    def fetch(tickers: list[str], start: str, end: str) -> pd.DataFrame:
+        requests.append(list(tickers))
+        close = pd.DataFrame(100.0, index=dates, columns=tickers)
+        return pd.concat({"Close": close, "Volume": close}, axis=1)
+
+    entry = src.download_cache._entry_path("AAA", "2026-01-05", "2026-01-10")
+    entry.parent.mkdir(parents=True)
+    entry.write_bytes(b"\x80\x05not a pickle")
+    fetch_cached = src.download_cache.cached_fetcher(fetch)
+    raw = fetch_cached(["AAA"], "2026-01-05", "2026-01-10")
+    fetch_cached(["AAA"], "2026-01-05", "2026-01-10")
+
+    assert requests == [["AAA"]]
+    assert raw["Close"]["AAA"].notna().all()
@@ -0,0 +1,75 @@
+"""Tests for the portfolio queries behind the API."""
+
+from collections.abc import Callable
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import src.portfolio
+from src.db import begin_run, get_connection, publish_run
+
+
+def _query_plan(
+    monkeypatch: pytest.MonkeyPatch, call: Callable[[], object],
+) -> list[str]:
+    """EXPLAIN QUERY PLAN details of every query ``call`` loads."""
+    captured = []
+    load_dataframe = src.portfolio.load_dataframe
+
+    def capture(query: str, params: tuple = ()) -> pd.DataFrame:
+        captured.append((query, params))
+        return load_dataframe(query, params)
+
+    monkeypatch.setattr(src.portfolio, "load_dataframe", capture)
+    call()
+    with get_connection(readonly=True) as conn:
+        return [
+            row[-1]
+            for query, params in captured
+            for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)
+        ]
+
+
+def _full_scans(plan: list[str]) -> list[str]:
+    # Covering-index or ordered-index scans bounded by the WHERE clause
+    # are SEARCHes; a bare SCAN reads the whole table
+    return [
+        detail for detail in plan
+        if detail.startswith("SCAN") and "USING" not in detail
+    ]
+
+
+@pytest.fixture
+def published_run(tmp_db: Path) -> int:
+    with get_connection() as conn:
+        run_id = begin_run(conn)
+        publish_run(conn, run_id)
+    return run_id
+
+
+@pytest.mark.parametrize("as_of_date", [None, "2026-01-30"])
+def test_top_stocks_seeks_scores_index_and_metrics_key(
+    published_run: int,
+    monkeypatch: pytest.MonkeyPatch,
+    as_of_date: str | None,
+) -> None:
+    plan = _query_plan(
+        monkeypatch,
+        lambda: src.portfolio.get_top_stocks("medium", as_of_date=as_of_date),
+    )
+
+    assert _full_scans(plan) == []
+    assert any("idx_scores_run_date_profile_rank" in d for d in plan)
+    assert any(d.startswith("SEARCH m USING PRIMARY KEY") for d in plan)
+
+
+def test_stock_detail_avoids_full_scans(
+    published_run: int, monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    plan = _query_plan(
+        monkeypatch, lambda: src.portfolio.get_stock_detail("AAA")
+    )
+
+    assert _full_scans(plan) == []
+    assert any("idx_scores_run_date_profile_rank" in d for d in plan)
@@ -0,0 +1,191 @@
+"""Tests for loading and downloading prices."""
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import src.pull_prices
+from src.db import execute_query, save_dataframe
+
+
+def _write_csv(path: Path, days: int = 5) -> None:
+    dates = pd.bdate_range("2026-01-05", periods=days)
+    pd.DataFrame({
+        "date": dates.strftime("%Y-%m-%d"),
+        "adj_close": range(100, 100 + days),
+        "volume": 1_000,
+    }).to_csv(path, index=False)
+
+
+def _indexes() -> set[str]:
+    return {
+        row[0] for row in execute_query(
+            "SELECT name FROM sqlite_master "
+            "WHERE type = 'index' AND tbl_name = 'price_bars'",
+            readonly=True,
+        )
+    }
+
+
+def test_failed_load_keeps_price_indexes(
+    tmp_db: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    files = tmp_path / "prices"
+    files.mkdir()
+    _write_csv(files / "AAA.csv")
+    _write_csv(files / "BBB.csv")
+    read = src.pull_prices._read_price_file
+
+    def read_then_fail(path: Path) -> pd.DataFrame:
+        if path.stem == "BBB":
+            raise OSError("disk went away")
+        return read(path)
+
+    monkeypatch.setattr(src.pull_prices, "_read_price_file", read_then_fail)
+    with pytest.raises(OSError):
+        src.pull_prices.load_price_files(files)
+
+    assert "idx_price_bars_day" in _indexes()
+    assert execute_query("SELECT COUNT(*) FROM price_bars") == [(0,)]
+
+
+def test_load_into_empty_table_rebuilds_indexes(
+    tmp_db: Path, tmp_path: Path,
+) -> None:
+    _write_csv(tmp_path / "AAA.csv")
+    assert src.pull_prices.load_price_files(tmp_path) == 5
+    assert "idx_price_bars_day" in _indexes()
+
+
+def _wide(tickers: list[str], start: str, end: str) -> pd.DataFrame:
+    """A yf.download-shaped frame with three bars per ticker."""
+    dates = pd.bdate_range(start, periods=3, name="Date")
+    return pd.concat({
+        "Close": pd.DataFrame(100.0, index=dates, columns=tickers),
+        "Volume": pd.DataFrame(1_000.0, index=dates, columns=tickers),
+    }, axis=1)
+
+
+def test_retry_refetches_only_tickers_returned_empty(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(src.pull_prices, "PRICE_RETRY_BACKOFF", 0.0)
+    requests = []
+
+    def fetch(tickers: list[str], start: str, end: str) -> pd.DataFrame:
+        # Like yf.download under throttling: BBB comes back all-NaN once
+        requests.append(list(tickers))
+        raw = _wide(tickers, start, end)
+        if len(requests) == 1:
+            raw.loc[:, (slice(None), "BBB")] = float("nan")
+        return raw
+
+    df, attempts = src.pull_prices._fetch_with_retry(
+        fetch, ["AAA", "BBB"], "2026-01-05", "2026-01-10", attempts=3
+    )
+    assert requests == [["AAA", "BBB"], ["BBB"]]
+    assert attempts == 2
+    assert df.groupby("ticker").size().to_dict() == {"AAA": 3, "BBB": 3}
+
+
+def test_retry_gives_up_on_tickers_never_returned(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(src.pull_prices, "PRICE_RETRY_BACKOFF", 0.0)
+
+    def fetch(tickers: list[str], start: str, end: str) -> pd.DataFrame:
+        return _wide([t for t in tickers if t != "GONE"], start, end)
+
+    df, attempts = src.pull_prices._fetch_with_retry(
+        fetch, ["AAA", "GONE"], "2026-01-05", "2026-01-10", attempts=3
+    )
+    assert attempts == 3
+    assert set(df["ticker"]) == {"AAA"}
+
+
+def test_price_file_dates_spanning_dst_change(tmp_path: Path) -> None:
+    path = tmp_path / "AAA.csv"
+    path.write_text(
+        "Date,Close,Volume\n"
+        "2026-03-06 00:00:00-05:00,100.0,10\n"
+        "2026-03-09 00:00:00-04:00,101.0,11\n"
+    )
+    df = src.pull_prices._read_price_file(path)
+    assert pd.to_datetime(df["day"], unit="D").dt.strftime(
+        "%Y-%m-%d"
+    ).tolist() == ["2026-03-06", "2026-03-09"]
+
+
+def test_parquet_without_pyarrow_names_the_package(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    def missing(path: Path) -> pd.DataFrame:
+        raise ImportError("Unable to find a usable engine")
+
+    monkeypatch.setattr(pd, "read_parquet", missing)
+    with pytest.raises(ImportError, match="pip install pyarrow"):
+        src.pull_prices._read_price_file(tmp_path / "AAA.parquet")
+
+
+def test_universe_ttl_ignores_custom_and_fallback_lists(
+    tmp_db: Path, monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    scraped: list[list[str]] = [[], ["AAA", "BBB"]]
+    monkeypatch.setattr(
+        src.pull_prices, "fetch_sp500_tickers", lambda: scraped.pop(0)
+    )
+
+    monkeypatch.setattr(src.pull_prices, "CUSTOM_TICKERS", ["ZZZ"])
+    assert src.pull_prices.refresh_universe().tickers == ["ZZZ"]
+
+    # A cleared custom list and a failed first scrape are not served for
+    # the TTL: the defaults are used once and the next run scrapes again
+    monkeypatch.setattr(src.pull_prices, "CUSTOM_TICKERS", [])
+    fallback = src.pull_prices.refresh_universe()
+    assert fallback.tickers == src.pull_prices.DEFAULT_TICKERS
+    assert src.pull_prices.refresh_universe().tickers == ["AAA", "BBB"]
+
+    assert execute_query("SELECT DISTINCT source FROM universe_refreshes") == [
+        ("sp500",)
+    ]
+    assert src.pull_prices.refresh_universe().tickers == ["AAA", "BBB"]
+    assert not scraped
+
+
+def test_restated_ticker_replaces_bars_before_history_window(
+    tmp_db: Path, monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    dates = pd.bdate_range(
+        end=pd.Timestamp.today().normalize() - pd.Timedelta(days=3),
+        periods=1_500,                  # about six years
+    )
+    save_dataframe(
+        pd.DataFrame({
+            "ticker": "AAA",
+            "date": dates.strftime("%Y-%m-%d"),
+            "adj_close": 100.0,
+            "volume": 1_000,
+        }),
+        "prices",
+    )
+    starts = []
+
+    def fetch(tickers: list[str], start: str, end: str) -> pd.DataFrame:
+        # A dividend halved every adjusted close
+        starts.append(start)
+        index = pd.bdate_range(start, end, name="Date")
+        return pd.concat({
+            "Close": pd.DataFrame(50.0, index=index, columns=tickers),
+            "Volume": pd.DataFrame(1_000.0, index=index, columns=tickers),
+        }, axis=1)
+
+    monkeypatch.setattr(
+        src.pull_prices, "get_ticker_universe", lambda: ["AAA"]
+    )
+    src.pull_prices.refresh_prices(fetch)
+
+    assert starts[-1] == dates[0].strftime("%Y-%m-%d")
+    assert execute_query(
+        "SELECT MIN(adj_close), MAX(adj_close) FROM price_bars"
+    ) == [(50.0, 50.0)]